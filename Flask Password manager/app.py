@@ -1,19 +1,39 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, g
 from werkzeug.utils import secure_filename
 import os
 import csv
-import pandas as pd
-from db_utils import create_connection, create_tables
-from user_functions import register_user, sign_in_user
+import hmac
+import time
+from functools import wraps
+import metrics
+from db_utils import get_connection, run_migrations, set_query_origin, reset_query_origin, MULTI_WORKER
+from user_functions import register_user, sign_in_user, set_user_password
 from supplier_functions import (
-    get_user_suppliers,
+    get_user_suppliers_page,
+    search_suppliers,
+    get_supplier_password,
+    SUPPLIER_PAGE_SIZE,
+    SEARCH_RESULT_LIMIT,
     add_supplier,
     allowed_file,
     modify_supplier,
+    apply_supplier_changes,
     delete_supplier,
+    restore_suppliers,
     view_password_reset_reminders,
+    supplier_cache_stats,
+    xlsx_supported,
+    XLSX_IMPORT_UNAVAILABLE,
 )
-from otp_utils import generate_otp, send_otp_via_email
+from otp_utils import queue_otp_email, outbox_size
+from otp_store import issue_otp, verify_otp as check_otp, revoke_otp, has_live_otp, OTP_STORE
+from import_jobs import submit_import, get_import_job, list_import_jobs
+from reminder_digest import start_digest_scheduler
+from supplier_trash import start_purge_scheduler
+from supplier_export import EXPORT_FORMATS, XLSX_UNAVAILABLE, iter_spool, spool_export
+from supplier_crypto import check_master_key
+from rate_limit import take as take_rate_limit_token, rate_limit_stats, RATE_LIMIT_STORE
+from session_store import load_secret_key, SECRET_KEY_FALLBACKS, SESSION_STORE, SqliteSessionInterface
 
 app = Flask(__name__)
 
@@ -24,10 +44,127 @@ if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
 ALLOWED_EXTENSIONS = {'csv', 'xls', 'xlsx'}
-app.secret_key = os.urandom(24)
+# Same key in every worker, so any of them can read any session cookie
+app.secret_key = load_secret_key()
+app.config["SECRET_KEY_FALLBACKS"] = SECRET_KEY_FALLBACKS
+if SESSION_STORE == "sqlite":
+    app.session_interface = SqliteSessionInterface()
+
+# Token-bucket limits as "capacity/seconds"
+LOGIN_RATE_LIMIT = os.getenv("LOGIN_RATE_LIMIT", "10/60")
+RESET_RATE_LIMIT = os.getenv("RESET_RATE_LIMIT", "3/300")
+REVEAL_RATE_LIMIT = os.getenv("REVEAL_RATE_LIMIT", "30/60")
+
+# Hash worker processes (see password_hashing) import this file again as
+# __mp_main__ when it is run directly; only the web process does startup work.
+if __name__ != "__mp_main__":
+    # Ensure the database schema is up to date
+    run_migrations()
+
+    # Refuse to start with a malformed key, or none while encrypted passwords exist
+    check_master_key()
+
+    # An OTP issued by one worker must verify on any other
+    if MULTI_WORKER and "memory" in (OTP_STORE, RATE_LIMIT_STORE):
+        print("Warning: several workers are configured but OTP_STORE or RATE_LIMIT_STORE is 'memory'; "
+              "OTPs and rate limits will not be shared between workers. Set both to 'sqlite'.")
+
+    # Optional in-process reminder digests (otherwise run reminder_digest.py from cron)
+    if os.getenv("REMINDER_DIGEST_ENABLED") == "1":
+        start_digest_scheduler()
+
+    # Purge expired supplier trash in-process unless disabled (supplier_trash.py also runs from cron)
+    if os.getenv("SUPPLIER_PURGE_ENABLED", "1") == "1":
+        start_purge_scheduler()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # Lets the slow-query log name the route behind each statement
+    rule = request.url_rule.rule if request.url_rule else request.path
+    g.query_origin_token = set_query_origin(f"{request.method} {rule}")
+
+@app.teardown_request
+def clear_query_origin(exc):
+    token = g.pop("query_origin_token", None)
+    if token is not None:
+        reset_query_origin(token)
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        # The URL rule, not the path, keeps label cardinality bounded
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.observe(
+            "passman_http_request_duration_seconds", "Request latency by route.",
+            time.perf_counter() - started, route=route, method=request.method,
+        )
+        metrics.inc(
+            "passman_http_requests_total", "Requests by route and status code.",
+            route=route, method=request.method, status=response.status_code,
+        )
+    return response
+
+@metrics.register_collector
+def collect_app_metrics():
+    cache = supplier_cache_stats()
+    return [
+        ("passman_rate_limit_checks_total", "counter", "Rate limit checks by limit and outcome.",
+         [({"limit": name, "result": result}, count)
+          for name, counter in rate_limit_stats().items() for result, count in counter.items()]),
+        ("passman_supplier_cache_events_total", "counter", "Supplier listing cache hits, misses and invalidations.",
+         [({"event": event}, count) for event, count in cache.items() if event not in ("owners", "rows")]),
+        ("passman_supplier_cache_owners", "gauge", "Owners currently held in the supplier listing cache.",
+         [({}, cache["owners"])]),
+        ("passman_supplier_cache_rows", "gauge", "Listing rows currently held in the supplier listing cache.",
+         [({}, cache["rows"])]),
+        ("passman_mail_outbox_depth", "gauge", "OTP emails waiting in the outbox.",
+         [({}, outbox_size())]),
+    ]
 
-# Ensure database tables are created
-create_tables()
+def rate_limited(name, rate, *key_funcs):
+    """
+    Throttle POSTs to a route with one token bucket per key.
+
+    Each key function maps the current request to a key (client IP, email,
+    user id...); a request must get a token from every bucket or it is
+    rejected with 429 and a Retry-After header.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method == "POST":
+                for key_func in key_funcs:
+                    key = key_func()
+                    if key is None:
+                        continue
+                    allowed, retry_after = take_rate_limit_token(name, key, rate)
+                    if not allowed:
+                        message = "Too many requests. Please try again later."
+                        if request.is_json:
+                            response = jsonify({"error": message})
+                        else:
+                            response = app.response_class(message, mimetype="text/plain")
+                        response.status_code = 429
+                        response.headers["Retry-After"] = str(retry_after)
+                        return response
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def client_ip():
+    return f"ip:{request.remote_addr}"
+
+def form_field(field):
+    def key():
+        value = request.form.get(field, "").strip().lower()
+        return f"{field}:{value}" if value else None
+    return key
+
+def session_user():
+    user = session.get("user")
+    return f"user:{user['id']}" if user else None
 
 @app.route("/")
 def home():
@@ -48,6 +185,7 @@ def register():
     return render_template("register.html")
 
 @app.route("/login", methods=["GET", "POST"])
+@rate_limited("login", LOGIN_RATE_LIMIT, client_ip, form_field("username"))
 def login():
     if request.method == "POST":
         username = request.form["username"]
@@ -63,22 +201,23 @@ def login():
     return render_template("login.html")
 
 @app.route("/reset_password", methods=["GET", "POST"])
+@rate_limited("reset_password", RESET_RATE_LIMIT, client_ip, form_field("email"))
 def reset_password():
     if request.method == "POST":
         email = request.form["email"]
-        conn = create_connection()
-        if not conn:
-            flash("Database connection error.", "danger")
-            return redirect(url_for("reset_password"))
-
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
-        user = cursor.fetchone()
+        with get_connection() as conn:
+            if not conn:
+                flash("Database connection error.", "danger")
+                return redirect(url_for("reset_password"))
+
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
+            user = cursor.fetchone()
         if user:
-            otp = generate_otp()
-            if send_otp_via_email(email, otp):
+            otp = issue_otp("reset", email)
+            if queue_otp_email(email, otp):
                 session["reset_email"] = email
-                session["reset_otp"] = otp
+                session.pop("reset_verified", None)
                 flash("OTP sent. Please verify.", "info")
                 return redirect(url_for("verify_otp"))
             flash("Failed to send OTP.", "danger")
@@ -90,23 +229,25 @@ def reset_password():
 def verify_otp():
     if request.method == "POST":
         otp = request.form["otp"]
-        if otp == session.get("reset_otp"):
+        email = session.get("reset_email")
+        if email and check_otp("reset", email, otp):
+            session["reset_verified"] = True
             return redirect(url_for("set_new_password"))
         flash("Invalid OTP. Try again.", "danger")
     return render_template("verify_otp.html")
 
 @app.route("/set_new_password", methods=["GET", "POST"])
 def set_new_password():
+    if not session.get("reset_verified") or not session.get("reset_email"):
+        flash("Please verify your OTP first.", "danger")
+        return redirect(url_for("reset_password"))
+
     if request.method == "POST":
         new_password = request.form["new_password"]
         email = session.get("reset_email")
-        conn = create_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE users SET password = ? WHERE email = ?", (new_password, email))
-        conn.commit()
-        conn.close()
+        set_user_password(email, new_password)
         session.pop("reset_email", None)
-        session.pop("reset_otp", None)
+        session.pop("reset_verified", None)
         flash("Password reset successful!", "success")
         return redirect(url_for("login"))
     return render_template("set_new_password.html")
@@ -136,7 +277,8 @@ def dashboard():
         {"name": "Password Reset Reminders", "url": url_for("password_reset_reminders")},
     ]
 
-    return render_template("dashboard.html", user=user, menu_options=menu_options)
+    import_jobs = list_import_jobs(user["id"])
+    return render_template("dashboard.html", user=user, menu_options=menu_options, import_jobs=import_jobs)
 
 @app.route("/add_suppliers", methods=["GET", "POST"])
 def add_suppliers():
@@ -163,35 +305,88 @@ def add_suppliers():
             success, msg = add_supplier(user_id, supplier_name, office_id, user_id_val, password, url)
             flash(msg, "success" if success else "danger")
 
-        elif 'file' in request.files:
+        elif 'file' in request.files or 'excel_file' in request.files:
             # Handle CSV or Excel upload
-            file = request.files['file']
+            file = request.files.get('file') or request.files['excel_file']
             if file.filename == '':
                 flash('No selected file.', 'danger')
                 return redirect(url_for("add_suppliers"))
 
+            if file.filename.lower().endswith(".xlsx") and not xlsx_supported():
+                # Refuse before saving rather than failing later in the import job
+                if request.accept_mimetypes.best == "application/json":
+                    return jsonify({"error": XLSX_IMPORT_UNAVAILABLE}), 415
+                flash(XLSX_IMPORT_UNAVAILABLE, "danger")
+                return redirect(url_for("add_suppliers"))
+
             if allowed_file(file.filename):
                 filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+                # Unique on-disk name so concurrent uploads never clobber each other
+                filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{os.urandom(8).hex()}_{filename}")
                 file.save(filepath)
 
-                # Check file type
-                if filename.endswith('.csv'):
-                    process_csv(filepath, user_id)
-                elif filename.endswith('.xls') or filename.endswith('.xlsx'):
-                    process_excel(filepath, user_id)
+                job_id, msg = submit_import(user_id, filepath, filename)
+                if not job_id:
+                    # Rejected jobs never run, so nothing else would delete the upload
+                    os.remove(filepath)
+                if request.accept_mimetypes.best == "application/json":
+                    if not job_id:
+                        return jsonify({"error": msg}), 503
+                    return jsonify({"job_id": job_id, "status_url": url_for("import_status", job_id=job_id)}), 202
+                if not job_id:
+                    flash(msg, "danger")
+                    return redirect(url_for("add_suppliers"))
+                flash(msg, "info")
+                return redirect(url_for("dashboard"))
+            else:
+                flash("Unsupported file type. Upload a .csv, .xls or .xlsx file.", "danger")
 
     return render_template("add_suppliers.html")
 
 
+@app.route("/api/suppliers/search", methods=["GET"])
+def api_search_suppliers():
+    if "logged_in" not in session or not session["logged_in"]:
+        return jsonify({"error": "Unauthorized access"}), 403
+
+    try:
+        limit = int(request.args.get("limit", SEARCH_RESULT_LIMIT))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    suppliers = search_suppliers(session["user"]["id"], request.args.get("q", ""), limit=limit)
+    return jsonify({"suppliers": [supplier._asdict() for supplier in suppliers]})
+
+@app.route("/api/password_reset_reminders", methods=["GET"])
+def api_password_reset_reminders():
+    if "logged_in" not in session or not session["logged_in"]:
+        return jsonify({"error": "Unauthorized access"}), 403
+
+    return jsonify({"reminders": view_password_reset_reminders(session["user"]["id"])})
+
+@app.route("/imports/<job_id>", methods=["GET"])
+def import_status(job_id):
+    if "logged_in" not in session or not session["logged_in"]:
+        return jsonify({"error": "Unauthorized access"}), 403
+
+    job = get_import_job(session["user"]["id"], job_id)
+    if not job:
+        return jsonify({"error": "Import job not found"}), 404
+    return jsonify(job)
+
+
 @app.route("/view_suppliers")
 def view_suppliers():
     if "logged_in" not in session or not session["logged_in"]:
         return redirect(url_for("login"))
 
     user_id = session["user"]["id"]
-    suppliers = get_user_suppliers(user_id)
-    return render_template("view_suppliers.html", suppliers=suppliers)
+    query = request.args.get("q", "").strip()
+    if query:
+        suppliers, next_cursor = search_suppliers(user_id, query), None
+    else:
+        suppliers, next_cursor = get_user_suppliers_page(user_id, after=request.args.get("after"))
+    return render_template("view_suppliers.html", suppliers=suppliers, next_cursor=next_cursor, query=query)
 
 @app.route("/modify_suppliers", methods=["GET", "POST"])
 def modify_suppliers():
@@ -199,11 +394,16 @@ def modify_suppliers():
         return redirect(url_for("login"))
 
     user_id = session["user"]["id"]
-    suppliers = get_user_suppliers(user_id)
+
+    if request.method == "POST" and "undo_delete" in request.form:
+        # Restoring the user's own last delete needs no OTP
+        success, msg = restore_suppliers(user_id, session.pop("undo_delete_ids", []))
+        flash(msg, "success" if success else "danger")
+        return redirect(url_for("modify_suppliers"))
 
     if request.method == "POST":
         otp = request.form.get("otp")
-        if otp != session.get("otp"):
+        if not check_otp("reveal", user_id, otp, consume=False):
             flash("Invalid OTP.", "danger")
             return redirect(url_for("modify_suppliers"))
 
@@ -211,19 +411,99 @@ def modify_suppliers():
             supplier_id = request.form["delete_supplier_id"]
             success, msg = delete_supplier(user_id, [supplier_id])
             flash(msg, "success" if success else "danger")
+            if success:
+                session["undo_delete_ids"] = [supplier_id]
         elif "delete_selected" in request.form:
             supplier_ids = request.form.getlist("supplier_ids")
             success, msg = delete_supplier(user_id, supplier_ids)
             flash(msg, "success" if success else "danger")
+            if success:
+                session["undo_delete_ids"] = supplier_ids
         elif "supplier_id" in request.form:
             supplier_id = request.form["supplier_id"]
             field = request.form["field"]
             new_value = request.form["new_value"]
             success, msg = modify_supplier(user_id, supplier_id, field, new_value)
             flash(msg, "success" if success else "danger")
-    return render_template("modify_suppliers.html", suppliers=suppliers)
+
+    suppliers, next_cursor = get_user_suppliers_page(user_id, after=request.args.get("after"))
+    return render_template("modify_suppliers.html", suppliers=suppliers, next_cursor=next_cursor)
+
+@app.route("/api/suppliers", methods=["GET"])
+def api_suppliers():
+    if "logged_in" not in session or not session["logged_in"]:
+        return jsonify({"error": "Unauthorized access"}), 403
+
+    user_id = session["user"]["id"]
+    try:
+        limit = int(request.args.get("limit", SUPPLIER_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    suppliers, next_cursor = get_user_suppliers_page(user_id, after=request.args.get("after"), limit=limit)
+    return jsonify({"suppliers": [supplier._asdict() for supplier in suppliers], "next": next_cursor})
+
+@app.route("/export_suppliers", methods=["POST"])
+@rate_limited("export_suppliers", REVEAL_RATE_LIMIT, client_ip, session_user)
+def export_suppliers():
+    """Download every supplier, passwords included, as CSV or XLSX (OTP required)."""
+    if "logged_in" not in session or not session["logged_in"]:
+        return redirect(url_for("login"))
+
+    user_id = session["user"]["id"]
+    if not check_otp("reveal", user_id, request.form.get("otp"), consume=False):
+        flash("Invalid OTP.", "danger")
+        return redirect(url_for("view_suppliers"))
+
+    export_format = request.form.get("format", "csv")
+    if export_format not in EXPORT_FORMATS:
+        flash("Unsupported export format.", "danger")
+        return redirect(url_for("view_suppliers"))
+    # Checked up front: once streaming starts the status line is already sent
+    if export_format == "xlsx" and not xlsx_supported():
+        flash(XLSX_UNAVAILABLE, "danger")
+        return redirect(url_for("view_suppliers"))
+
+    # Built before the response starts, so a password that fails to decrypt
+    # becomes an error message instead of a silently truncated download
+    try:
+        spool = spool_export(user_id, export_format)
+    except ValueError as e:
+        print(f"Error exporting suppliers for user {user_id}: {e}")
+        flash("Export failed: a stored password could not be decrypted.", "danger")
+        return redirect(url_for("view_suppliers"))
+
+    response = app.response_class(iter_spool(spool), mimetype=EXPORT_FORMATS[export_format])
+    response.headers["Content-Disposition"] = f"attachment; filename=suppliers.{export_format}"
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+@app.route("/api/suppliers/batch", methods=["POST"])
+def api_suppliers_batch():
+    """
+    Apply many supplier updates/deletes/restores at once:
+    {"otp": "...", "changes": [{"op": "update", "id": 1, "fields": {"url": "..."}},
+                               {"op": "delete", "id": 2}, {"op": "restore", "id": 3}]}
+    The batch runs in one transaction and is all-or-nothing.
+    """
+    if "logged_in" not in session or not session["logged_in"]:
+        return jsonify({"error": "Unauthorized access"}), 403
+
+    user_id = session["user"]["id"]
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    if not check_otp("reveal", user_id, payload.get("otp"), consume=False):
+        return jsonify({"error": "Invalid OTP"}), 401
+
+    success, results = apply_supplier_changes(user_id, payload.get("changes"))
+    return jsonify({"applied": success, "results": results}), 200 if success else 400
+
+PASSWORD_REVEALS = "passman_password_reveals_total"
+PASSWORD_REVEALS_HELP = "Supplier password reveal attempts by outcome."
 
 @app.route("/fetch_password/<int:supplier_id>", methods=["POST"])
+@rate_limited("fetch_password", REVEAL_RATE_LIMIT, client_ip, session_user)
 def fetch_password(supplier_id):
     if "logged_in" not in session or not session["logged_in"]:
         return jsonify({"error": "Unauthorized access"}), 403
@@ -231,36 +511,61 @@ def fetch_password(supplier_id):
     user_id = session["user"]["id"]
     otp = request.json.get("otp")
 
-    print(f"Supplier ID: {supplier_id}, User ID: {user_id}, OTP: {otp}")  # Debug print
-
     # Validate OTP
-    if otp != session.get("reset_otp"):  # Ensure OTP matches
-        print("Invalid OTP")  # Debug print
+    if not check_otp("reveal", user_id, otp, consume=False):
+        metrics.inc(PASSWORD_REVEALS, PASSWORD_REVEALS_HELP, result="invalid_otp")
         return jsonify({"error": "Invalid OTP"}), 401
 
-    conn = create_connection()
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "SELECT password FROM suppliers WHERE supplier_id = ? AND owner_user_id = ?",
-        (supplier_id, user_id)
-    )
-    result = cursor.fetchone()
-    conn.close()
+    try:
+        password = get_supplier_password(user_id, supplier_id)
+    except ValueError as e:
+        print(f"Error revealing supplier {supplier_id} for user {user_id}: {e}")
+        metrics.inc(PASSWORD_REVEALS, PASSWORD_REVEALS_HELP, result="error")
+        return jsonify({"error": "Stored password could not be decrypted."}), 500
 
-    if result:
-        print(f"Password fetched: {result[0]}")  # Debug print
-        return jsonify({"password": result[0]})
+    if password is not None:
+        metrics.inc(PASSWORD_REVEALS, PASSWORD_REVEALS_HELP, result="revealed")
+        return jsonify({"password": password})
     else:
-        print("Supplier not found or unauthorized access")  # Debug print
+        metrics.inc(PASSWORD_REVEALS, PASSWORD_REVEALS_HELP, result="not_found")
         return jsonify({"error": "Supplier not found or unauthorized access"}), 404
 
+@app.route("/request_otp", methods=["POST"])
+@rate_limited("request_otp", RESET_RATE_LIMIT, client_ip, session_user)
+def request_otp():
+    if "logged_in" not in session or not session["logged_in"]:
+        return jsonify({"error": "Unauthorized access"}), 403
+
+    user = session["user"]
+    # Reissuing would invalidate the code already on its way, so only an
+    # explicit resend replaces a live one
+    resend = bool((request.get_json(silent=True) or {}).get("resend"))
+    if not resend and has_live_otp("reveal", user["id"]):
+        return jsonify({"message": "An OTP was already sent to your registered email address."})
+    otp = issue_otp("reveal", user["id"])
+    if not queue_otp_email(user["email"], otp):
+        revoke_otp("reveal", user["id"])
+        return jsonify({"error": "Failed to send OTP."}), 503
+    return jsonify({"message": "OTP sent to your registered email address."})
+
 @app.route("/set_debug_otp")
 def set_debug_otp():
-    session["reset_otp"] = "123456"  # Replace with a test OTP
+    if not app.debug or "logged_in" not in session:
+        return "Not found", 404
+    issue_otp("reveal", session["user"]["id"], code="123456")
     return "Debug OTP set to 123456"
 
 
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape endpoint; protected by METRICS_TOKEN when it is set."""
+    if metrics.METRICS_TOKEN and not hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {metrics.METRICS_TOKEN}"
+    ):
+        return "Unauthorized", 401
+    return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/logout")
 def logout():
     session.clear()  # Clear the session data
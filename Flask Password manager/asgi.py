@@ -0,0 +1,233 @@
+"""
+Optional async (ASGI) serving mode.
+
+    pip install quart
+    hypercorn asgi:application
+
+The supplier listing/search, reminder, reveal and OTP JSON routes run as
+async Quart handlers. SQLite work is offloaded to a bounded thread pool
+(each thread keeps its own pooled connection, see db_utils) and OTP mail
+goes through the same pooled, retrying outbox as the Flask app, so a
+request waiting on the database or the mail server does not tie up a worker
+thread. Every other route is forwarded to
+the Flask app in app.py, which can still be served on its own by any WSGI
+server exactly as before.
+"""
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Quart, g, jsonify, request, session
+from quart.sessions import SessionInterface
+from werkzeug.exceptions import HTTPException
+
+import metrics
+from app import (
+    app as wsgi_app,
+    REVEAL_RATE_LIMIT,
+    RESET_RATE_LIMIT,
+    PASSWORD_REVEALS,
+    PASSWORD_REVEALS_HELP,
+)
+from db_utils import set_query_origin
+from otp_store import issue_otp, verify_otp as check_otp, revoke_otp, has_live_otp
+from otp_utils import queue_otp_email
+from rate_limit import take as take_rate_limit_token
+from session_store import SESSION_STORE, open_server_session, save_server_session, write_session_cookie
+from supplier_functions import (
+    get_user_suppliers_page,
+    search_suppliers,
+    get_supplier_password,
+    view_password_reset_reminders,
+    SUPPLIER_PAGE_SIZE,
+    SEARCH_RESULT_LIMIT,
+)
+
+DB_OFFLOAD_WORKERS = int(os.getenv("DB_OFFLOAD_WORKERS", "8"))
+# Largest request body forwarded to the WSGI app (uploads go through it)
+ASGI_MAX_BODY_BYTES = int(os.getenv("ASGI_MAX_BODY_BYTES", str(100 * 1024 * 1024)))
+
+_db_executor = ThreadPoolExecutor(max_workers=DB_OFFLOAD_WORKERS, thread_name_prefix="db-offload")
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking (SQLite) call on the offload pool, keeping context variables."""
+    context = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, partial(context.run, func, *args, **kwargs))
+
+
+async_app = Quart(__name__)
+# Read the session cookie set by the Flask app (same signing scheme)
+async_app.secret_key = wsgi_app.secret_key
+async_app.config["SECRET_KEY_FALLBACKS"] = wsgi_app.config["SECRET_KEY_FALLBACKS"]
+async_app.config["SESSION_COOKIE_NAME"] = wsgi_app.config["SESSION_COOKIE_NAME"]
+
+
+class AsyncSqliteSessionInterface(SessionInterface):
+    """The server-side session store (SESSION_STORE=sqlite), run on the offload pool."""
+
+    async def open_session(self, app, request):
+        return await run_blocking(open_server_session, app, request.cookies.get(self.get_cookie_name(app)))
+
+    async def save_session(self, app, session, response):
+        action = await run_blocking(save_server_session, app, session)
+        write_session_cookie(self, app, session, response, action)
+
+
+if SESSION_STORE == "sqlite":
+    async_app.session_interface = AsyncSqliteSessionInterface()
+
+
+@async_app.before_request
+async def start_request_timer():
+    g.request_started = time.perf_counter()
+    rule = request.url_rule.rule if request.url_rule else request.path
+    # Each request is its own task, so this never leaks into another request
+    set_query_origin(f"{request.method} {rule} (async)")
+
+
+@async_app.after_request
+async def record_request_metrics(response):
+    started = getattr(g, "request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.observe(
+            "passman_http_request_duration_seconds", "Request latency by route.",
+            time.perf_counter() - started, route=route, method=request.method,
+        )
+        metrics.inc(
+            "passman_http_requests_total", "Requests by route and status code.",
+            route=route, method=request.method, status=response.status_code,
+        )
+    return response
+
+
+def _session_user_id():
+    if "logged_in" not in session or not session["logged_in"]:
+        return None
+    return session["user"]["id"]
+
+
+async def _rate_limited(name, rate, user_id):
+    """Async version of app.rate_limited: a 429 response, or None if allowed."""
+    for key in (f"ip:{request.remote_addr}", f"user:{user_id}"):
+        allowed, retry_after = await run_blocking(take_rate_limit_token, name, key, rate)
+        if not allowed:
+            response = jsonify({"error": "Too many requests. Please try again later."})
+            response.status_code = 429
+            response.headers["Retry-After"] = str(retry_after)
+            return response
+    return None
+
+
+@async_app.route("/api/suppliers", methods=["GET"])
+async def api_suppliers():
+    user_id = _session_user_id()
+    if user_id is None:
+        return jsonify({"error": "Unauthorized access"}), 403
+    try:
+        limit = int(request.args.get("limit", SUPPLIER_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    suppliers, next_cursor = await run_blocking(
+        get_user_suppliers_page, user_id, after=request.args.get("after"), limit=limit
+    )
+    return jsonify({"suppliers": [supplier._asdict() for supplier in suppliers], "next": next_cursor})
+
+
+@async_app.route("/api/suppliers/search", methods=["GET"])
+async def api_search_suppliers():
+    user_id = _session_user_id()
+    if user_id is None:
+        return jsonify({"error": "Unauthorized access"}), 403
+    try:
+        limit = int(request.args.get("limit", SEARCH_RESULT_LIMIT))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    suppliers = await run_blocking(search_suppliers, user_id, request.args.get("q", ""), limit=limit)
+    return jsonify({"suppliers": [supplier._asdict() for supplier in suppliers]})
+
+
+@async_app.route("/api/password_reset_reminders", methods=["GET"])
+async def api_password_reset_reminders():
+    user_id = _session_user_id()
+    if user_id is None:
+        return jsonify({"error": "Unauthorized access"}), 403
+
+    return jsonify({"reminders": await run_blocking(view_password_reset_reminders, user_id)})
+
+
+@async_app.route("/fetch_password/<int:supplier_id>", methods=["POST"])
+async def fetch_password(supplier_id):
+    user_id = _session_user_id()
+    if user_id is None:
+        return jsonify({"error": "Unauthorized access"}), 403
+    limited = await _rate_limited("fetch_password", REVEAL_RATE_LIMIT, user_id)
+    if limited:
+        return limited
+
+    payload = await request.get_json(silent=True) or {}
+    if not await run_blocking(check_otp, "reveal", user_id, payload.get("otp"), consume=False):
+        metrics.inc(PASSWORD_REVEALS, PASSWORD_REVEALS_HELP, result="invalid_otp")
+        return jsonify({"error": "Invalid OTP"}), 401
+
+    try:
+        password = await run_blocking(get_supplier_password, user_id, supplier_id)
+    except ValueError as e:
+        print(f"Error revealing supplier {supplier_id} for user {user_id}: {e}")
+        metrics.inc(PASSWORD_REVEALS, PASSWORD_REVEALS_HELP, result="error")
+        return jsonify({"error": "Stored password could not be decrypted."}), 500
+    if password is None:
+        metrics.inc(PASSWORD_REVEALS, PASSWORD_REVEALS_HELP, result="not_found")
+        return jsonify({"error": "Supplier not found or unauthorized access"}), 404
+    metrics.inc(PASSWORD_REVEALS, PASSWORD_REVEALS_HELP, result="revealed")
+    return jsonify({"password": password})
+
+
+@async_app.route("/request_otp", methods=["POST"])
+async def request_otp():
+    user_id = _session_user_id()
+    if user_id is None:
+        return jsonify({"error": "Unauthorized access"}), 403
+    limited = await _rate_limited("request_otp", RESET_RATE_LIMIT, user_id)
+    if limited:
+        return limited
+
+    payload = await request.get_json(silent=True) or {}
+    if not payload.get("resend") and await run_blocking(has_live_otp, "reveal", user_id):
+        return jsonify({"message": "An OTP was already sent to your registered email address."})
+    email = session["user"]["email"]
+    otp = await run_blocking(issue_otp, "reveal", user_id)
+    # Only enqueues; the outbox workers send and retry with backoff
+    sent = queue_otp_email(email, otp)
+    if not sent:
+        await run_blocking(revoke_otp, "reveal", user_id)
+        return jsonify({"error": "Failed to send OTP."}), 503
+    return jsonify({"message": "OTP sent to your registered email address."})
+
+
+_async_routes = async_app.url_map.bind("")
+_wsgi = AsyncioWSGIMiddleware(wsgi_app, max_body_size=ASGI_MAX_BODY_BYTES)
+
+
+def _is_async_route(scope):
+    try:
+        _async_routes.match(scope["path"], method=scope["method"])
+        return True
+    except HTTPException:
+        return False
+
+
+async def application(scope, receive, send):
+    """ASGI entry point: async routes go to Quart, everything else to the Flask app."""
+    if scope["type"] == "http" and not _is_async_route(scope):
+        await _wsgi(scope, receive, send)
+    else:
+        await async_app(scope, receive, send)
@@ -0,0 +1,274 @@
+"""
+Data-layer micro-benchmarks.
+
+Seeds synthetic databases (by default 1k, 100k and 1M suppliers spread over
+100 owners), times the hot supplier and login paths against each, and writes
+the results as JSON so runs from different commits can be compared with
+benchmarks/compare.py:
+
+    python benchmarks/bench_data_layer.py --sizes 1000,100000 --output before.json
+    git checkout <other commit>
+    python benchmarks/bench_data_layer.py --sizes 1000,100000 --output after.json
+    python benchmarks/compare.py before.json after.json
+
+Seeded databases are cached in benchmarks/.data and copied before every run,
+so the timed mutations never touch the cached copy. Pass --reseed after a
+schema change.
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import db_utils  # noqa: E402
+from password_hashing import hash_password  # noqa: E402
+from supplier_functions import (  # noqa: E402
+    IMPORT_HEADERS,
+    delete_supplier,
+    get_user_suppliers,
+    get_user_suppliers_page,
+    import_suppliers_from_csv,
+    invalidate_supplier_cache,
+    restore_suppliers,
+    view_password_reset_reminders,
+)
+from user_functions import sign_in_user  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCH_DIR, ".data")
+SEED_PASSWORD = "benchmark-password"
+SEED_BATCH_SIZE = 10000
+
+
+def _username(owner):
+    return f"bench-user-{owner}"
+
+
+def seed_database(path, suppliers, owners, seed=0):
+    """
+    Create a database at path with owners users and suppliers suppliers.
+
+    last_reset is spread over the last 40 days so roughly one supplier in
+    six falls inside the reminder window. All users share one password hash
+    to keep seeding fast.
+    """
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    db_utils.run_migrations(path)
+
+    rng = random.Random(seed)
+    now = datetime.now()
+    password_hash = hash_password(SEED_PASSWORD)
+    with db_utils.get_connection(path) as conn:
+        conn.executemany(
+            "INSERT INTO users (user_id, username, email, password) VALUES (?, ?, ?, ?)",
+            [(owner, _username(owner), f"{_username(owner)}@example.com", password_hash)
+             for owner in range(1, owners + 1)],
+        )
+
+        # Index everything for search once at the end, as bulk imports do
+        conn.execute("INSERT INTO fts_sync_paused (paused) VALUES (1)")
+        for start in range(0, suppliers, SEED_BATCH_SIZE):
+            rows = []
+            for n in range(start, min(start + SEED_BATCH_SIZE, suppliers)):
+                created = now - timedelta(days=rng.uniform(0, 365))
+                last_reset = now - timedelta(days=rng.uniform(0, 40))
+                rows.append((
+                    f"Supplier {n}", f"OF{n % 997}", f"login{n}", "seed-password",
+                    f"https://supplier{n}.example.com", created.strftime("%Y-%m-%d %H:%M:%S"),
+                    last_reset.strftime("%Y-%m-%d %H:%M:%S"), rng.randint(1, owners),
+                ))
+            conn.executemany(
+                """
+                INSERT INTO suppliers (supplier_name, office_id, user_id, password, url,
+                                       date_created, last_reset, owner_user_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+        conn.execute("INSERT INTO suppliers_fts (suppliers_fts) VALUES ('rebuild')")
+        conn.execute("DELETE FROM fts_sync_paused")
+
+    with db_utils.get_connection(path) as conn:
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    db_utils.close_connections()
+
+
+def prepared_database(suppliers, owners, reseed=False):
+    """Return a fresh working copy of the cached seed database for this size."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    template = os.path.join(DATA_DIR, f"seed-{suppliers}-{owners}.db")
+    if reseed or not os.path.exists(template):
+        started = time.perf_counter()
+        seed_database(template, suppliers, owners)
+        print(f"  seeded {suppliers} suppliers in {time.perf_counter() - started:.1f}s")
+
+    work = os.path.join(DATA_DIR, f"work-{suppliers}-{owners}.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(work + suffix):
+            os.remove(work + suffix)
+    shutil.copyfile(template, work)
+    return work
+
+
+def _summary(samples):
+    samples = sorted(samples)
+    return {
+        "runs": len(samples),
+        "min_ms": samples[0] * 1000,
+        "median_ms": statistics.median(samples) * 1000,
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+        "max_ms": samples[-1] * 1000,
+        "mean_ms": statistics.fmean(samples) * 1000,
+    }
+
+
+def time_operation(operation, repeat, setup=None, teardown=None):
+    """
+    Time operation(arg) repeat times after one untimed warm-up.
+
+    setup() returns the argument for each call; teardown(arg) undoes any
+    changes outside the timed section.
+    """
+    samples = []
+    for run in range(repeat + 1):
+        arg = setup() if setup else None
+        started = time.perf_counter()
+        operation(arg)
+        elapsed = time.perf_counter() - started
+        if teardown:
+            teardown(arg)
+        if run:
+            samples.append(elapsed)
+    return _summary(samples)
+
+
+def write_import_csv(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(IMPORT_HEADERS)
+        for n in range(rows):
+            writer.writerow([f"Imported {n}", f"IM{n % 97}", f"import{n}", f"pw-{n}", f"https://import{n}.example.com"])
+
+
+def run_size(suppliers, owners, args):
+    db_path = prepared_database(suppliers, owners, reseed=args.reseed)
+    db_utils.DB_PATH = db_path
+    db_utils.close_connections()
+
+    rng = random.Random(1)
+    pick_owner = lambda: rng.randint(1, owners)  # noqa: E731
+
+    def cold_owner():
+        owner = pick_owner()
+        invalidate_supplier_cache(owner)
+        return owner
+
+    warm = pick_owner()
+    get_user_suppliers(warm)
+
+    def live_ids(_=None):
+        owner = pick_owner()
+        with db_utils.get_shard_connection(owner) as conn:
+            ids = [row[0] for row in conn.execute(
+                "SELECT supplier_id FROM suppliers WHERE owner_user_id = ? AND deleted_at IS NULL LIMIT ?",
+                (owner, args.delete_batch),
+            )]
+        return owner, ids
+
+    import_csv = os.path.join(DATA_DIR, f"import-{args.import_rows}.csv")
+    write_import_csv(import_csv, args.import_rows)
+
+    repeat = args.repeat
+    operations = {
+        "get_user_suppliers_cold": time_operation(get_user_suppliers, repeat, setup=cold_owner),
+        "get_user_suppliers_warm": time_operation(lambda _: get_user_suppliers(warm), repeat),
+        "get_user_suppliers_page": time_operation(get_user_suppliers_page, repeat, setup=cold_owner),
+        "view_password_reset_reminders": time_operation(view_password_reset_reminders, repeat, setup=pick_owner),
+        "delete_supplier": time_operation(
+            lambda owner_ids: delete_supplier(*owner_ids),
+            repeat,
+            setup=live_ids,
+            teardown=lambda owner_ids: restore_suppliers(*owner_ids),
+        ),
+        "sign_in_user": time_operation(
+            lambda _: sign_in_user(_username(pick_owner()), SEED_PASSWORD), args.login_repeat
+        ),
+        "import_suppliers_from_csv": time_operation(
+            lambda owner: import_suppliers_from_csv(owner, import_csv), args.import_repeat, setup=pick_owner
+        ),
+    }
+    operations["import_suppliers_from_csv"]["rows"] = args.import_rows
+    operations["delete_supplier"]["rows"] = args.delete_batch
+    db_utils.close_connections()
+
+    for name, result in operations.items():
+        print(f"  {name:32} median {result['median_ms']:9.2f} ms   p95 {result['p95_ms']:9.2f} ms")
+    return {"suppliers": suppliers, "owners": owners, "operations": operations}
+
+
+def _git_revision():
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               cwd=APP_DIR, capture_output=True, text=True).stdout.strip()
+        return revision + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="comma-separated supplier counts")
+    parser.add_argument("--owners", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per read/delete operation")
+    parser.add_argument("--login-repeat", type=int, default=10)
+    parser.add_argument("--import-repeat", type=int, default=5)
+    parser.add_argument("--import-rows", type=int, default=1000)
+    parser.add_argument("--delete-batch", type=int, default=100)
+    parser.add_argument("--reseed", action="store_true", help="rebuild cached seed databases")
+    parser.add_argument("--output", help="JSON results path (default benchmarks/results/<revision>.json)")
+    args = parser.parse_args(argv)
+
+    revision = _git_revision()
+    results = {
+        "meta": {
+            "revision": revision,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "runs": [],
+    }
+    for size in (int(size) for size in args.sizes.split(",")):
+        print(f"{size} suppliers / {args.owners} owners")
+        results["runs"].append(run_size(size, args.owners, args))
+
+    output = args.output or os.path.join(BENCH_DIR, "results", f"{revision or 'results'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
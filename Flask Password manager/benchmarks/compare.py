@@ -0,0 +1,60 @@
+"""
+Compare two bench_data_layer.py result files.
+
+    python benchmarks/compare.py before.json after.json [--threshold 1.25]
+
+Prints the median time of every operation at every size side by side and
+exits with status 1 if any got slower than the threshold ratio.
+"""
+import argparse
+import json
+import sys
+
+
+def _index(results, metric):
+    return {
+        (run["suppliers"], run["owners"], name): result[metric]
+        for run in results["runs"]
+        for name, result in run["operations"].items()
+    }
+
+
+def compare(baseline, candidate, metric="median_ms", threshold=1.25):
+    """Return [(suppliers, owners, operation, base, new, ratio, regressed)] for operations in both files."""
+    base = _index(baseline, metric)
+    new = _index(candidate, metric)
+    rows = []
+    for key in sorted(base.keys() & new.keys()):
+        ratio = new[key] / base[key] if base[key] else float("inf")
+        rows.append((*key, base[key], new[key], ratio, ratio > threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--metric", default="median_ms", choices=["min_ms", "median_ms", "p95_ms", "mean_ms"])
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as file:
+        baseline = json.load(file)
+    with open(args.candidate, encoding="utf-8") as file:
+        candidate = json.load(file)
+
+    print(f"{baseline['meta']['revision']} -> {candidate['meta']['revision']} ({args.metric})")
+    rows = compare(baseline, candidate, args.metric, args.threshold)
+    for suppliers, owners, name, before, after, ratio, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{suppliers:>9} {name:32} {before:10.2f} -> {after:10.2f} ms  x{ratio:5.2f}{flag}")
+
+    regressions = sum(row[-1] for row in rows)
+    if regressions:
+        print(f"{regressions} operation(s) slower than x{args.threshold}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,43 +1,725 @@
+import logging
+import os
+import re
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
 
-def create_connection():
+import metrics
+
+DB_PATH = os.getenv("DB_PATH", "password_manager.db")
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", "256"))
+# Log statements slower than this many milliseconds (execute plus fetching
+# their rows) with their query plan; unset disables the slow-query log.
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS")) if os.getenv("SLOW_QUERY_MS") else None
+# Most database files one thread keeps open; idle ones beyond this are closed
+# least recently used first. Only matters with many shards.
+DB_POOL_MAX_CONNECTIONS = int(os.getenv("DB_POOL_MAX_CONNECTIONS", "32"))
+
+# Optional per-tenant sharding of supplier data, so one owner's import does
+# not hold the write lock for everyone. "off" keeps suppliers in DB_PATH;
+# "owner" gives every owner their own file; "hash" spreads owners over
+# SHARD_COUNT files. Users, sessions, OTPs and rate limits stay in DB_PATH.
+# Existing databases are split with `python shard_tool.py split`.
+SHARD_MODE = os.getenv("SHARD_MODE", "off")
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "16"))
+SHARD_DIR = os.getenv("SHARD_DIR", "shards")
+
+# Several processes serve the app (WEB_CONCURRENCY, as read by gunicorn, or
+# server-side sessions, which only exist to be shared). Only used to warn
+# about per-process stores: a plain `gunicorn -w 4` sets neither.
+MULTI_WORKER = os.getenv("SESSION_STORE") == "sqlite" or int(os.getenv("WEB_CONCURRENCY", "1")) > 1
+# Worker count cannot be detected reliably, so OTPs and rate limits are kept
+# in SQLite unless "memory" is chosen explicitly (safe with one process only).
+SHARED_STORE_DEFAULT = "sqlite"
+
+slow_query_log = logging.getLogger("passman.slow_queries")
+
+# One connection per (thread, database file); reused across requests.
+_local = threading.local()
+
+_SQL_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+\"?(\w+)", re.IGNORECASE)
+_FULL_SCAN = re.compile(r"^SCAN \w+$")
+
+# What issued the current queries, e.g. "GET /view_suppliers"; set by app.py
+# per request. Background threads fall back to their thread name.
+_query_origin = ContextVar("query_origin", default=None)
+
+
+def set_query_origin(origin):
+    """Tag queries run in this context with origin; returns a token for reset_query_origin."""
+    return _query_origin.set(origin)
+
+
+def reset_query_origin(token):
+    _query_origin.reset(token)
+
+
+@lru_cache(maxsize=1024)
+def statement_label(sql):
+    """Low-cardinality metric label for a statement, e.g. "SELECT suppliers"."""
+    words = sql.split(None, 1)
+    verb = words[0].upper() if words else ""
+    if verb not in ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH"):
+        return verb
+    match = _SQL_TABLE.search(sql)
+    return f"{verb} {match.group(1)}" if match else verb
+
+
+def _redact(parameters):
+    """Keep only the shape of bound parameters: ("int", "str") or {"name": "str"}."""
+    if parameters is None:
+        return None
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    return tuple(type(value).__name__ for value in parameters)
+
+
+def _query_plan(conn, sql, parameters):
+    if statement_label(sql).split()[0] not in ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH"):
+        return []
+    try:
+        # The base-class execute keeps the EXPLAIN itself out of metrics and this log
+        rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, parameters or ()).fetchall()
+    except sqlite3.Error as e:
+        return [f"(no plan: {e})"]
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+def _log_slow_query(conn, sql, parameters, seconds, execute_seconds, rows):
+    plan = _query_plan(conn, sql, parameters)
+    full_scan = any(_FULL_SCAN.match(line.strip()) for line in plan)
+    origin = _query_origin.get() or threading.current_thread().name
+    slow_query_log.warning(
+        "Slow query (%.1f ms: execute %.1f ms, fetch %.1f ms, %d rows; %s)%s: %s params=%s%s",
+        seconds * 1000, execute_seconds * 1000, (seconds - execute_seconds) * 1000, rows,
+        origin, " [full scan]" if full_scan else "",
+        " ".join(sql.split()), _redact(parameters),
+        "".join(f"\n    plan: {line}" for line in plan),
+    )
+    metrics.inc(
+        "passman_sql_slow_queries_total", "Statements slower than SLOW_QUERY_MS.",
+        statement=statement_label(sql),
+    )
+
+
+def _record_query(conn, sql, parameters, seconds, execute_seconds=None, rows=0):
+    metrics.observe(
+        "passman_sql_query_duration_seconds", "Time spent executing SQL statements.",
+        seconds, metrics.SQL_BUCKETS, statement=statement_label(sql),
+    )
+    if SLOW_QUERY_MS is not None and seconds * 1000 >= SLOW_QUERY_MS:
+        try:
+            _log_slow_query(
+                conn, sql, parameters, seconds, seconds if execute_seconds is None else execute_seconds, rows
+            )
+        except Exception as e:
+            print(f"Error logging slow query: {e}")
+
+
+class TracedCursor(sqlite3.Cursor):
+    """
+    Cursor that records how long each statement takes.
+
+    SQLite produces rows lazily, so a query's cost is mostly paid while its
+    rows are fetched. Time spent in execute() and every fetch is summed and
+    recorded once the statement is done: its rows are exhausted, or the
+    cursor is closed, reused for another statement or dropped.
+    """
+
+    _pending = None
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending:
+            _record_query(self.connection, *pending)
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
+        try:
+            result = method(self, *args)
+        finally:
+            if self._pending:
+                self._pending[2] += time.perf_counter() - started
+        if self._pending:
+            if method in (sqlite3.Cursor.execute, sqlite3.Cursor.executemany):
+                self._pending[3] = self._pending[2]
+            elif method is sqlite3.Cursor.fetchone or method is sqlite3.Cursor.__next__:
+                self._pending[4] += result is not None
+            else:
+                self._pending[4] += len(result)
+        return result
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        # [sql, parameters, seconds, execute_seconds, rows]
+        self._pending = [sql, parameters, 0.0, 0.0, 0]
+        return self._timed(sqlite3.Cursor.execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        # Explain with the first row when we can; generators cannot be peeked
+        sample = seq_of_parameters[0] if isinstance(seq_of_parameters, (list, tuple)) and seq_of_parameters else None
+        self._pending = [sql, sample, 0.0, 0.0, 0]
+        return self._timed(sqlite3.Cursor.executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        row = self._timed(sqlite3.Cursor.fetchone)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = self._timed(sqlite3.Cursor.fetchmany, size)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(sqlite3.Cursor.fetchall)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            return self._timed(sqlite3.Cursor.__next__)
+        except StopIteration:
+            self._finish()
+            raise
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class TracedConnection(sqlite3.Connection):
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    # sqlite3.Connection.execute bypasses Python cursor subclasses, so
+    # route the shortcuts through cursor() to get them timed too.
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def create_connection(db_path=None):
+    """
+    Open and configure a new SQLite connection.
+
+    Prefer get_connection(), which hands out the pooled per-thread connection.
+    """
     try:
-        conn = sqlite3.connect("password_manager.db")
+        conn = sqlite3.connect(
+            db_path or DB_PATH,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            cached_statements=DB_STATEMENT_CACHE,
+            factory=TracedConnection if metrics.METRICS_ENABLED or SLOW_QUERY_MS is not None else sqlite3.Connection,
+        )
+        # Only takes effect on a new, empty database file; existing files are
+        # converted once with `python supplier_trash.py --enable-auto-vacuum`.
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+        conn.execute("PRAGMA journal_mode = WAL;")
+        conn.execute("PRAGMA synchronous = NORMAL;")
+        conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS};")
         conn.execute("PRAGMA foreign_keys = 1;")
         return conn
     except sqlite3.Error as e:
         print(f"Error creating DB connection: {e}")
     return None
 
-def create_tables():
-    conn = create_connection()
-    if not conn:
+
+def _pool():
+    # A forked worker must not reuse connections inherited from its parent.
+    if getattr(_local, "pid", None) != os.getpid():
+        _local.pid = os.getpid()
+        _local.connections = OrderedDict()
+        _local.depth = {}
+    return _local
+
+
+def _pooled_connection(db_path):
+    pool = _pool()
+    conn = pool.connections.get(db_path)
+    if conn is None:
+        conn = create_connection(db_path)
+        if conn is not None:
+            pool.connections[db_path] = conn
+            pool.depth[db_path] = 0
+            _close_idle_connections(pool, keep=db_path)
+    else:
+        pool.connections.move_to_end(db_path)
+    return conn
+
+
+def _close_idle_connections(pool, keep):
+    for path in list(pool.connections):
+        if len(pool.connections) <= DB_POOL_MAX_CONNECTIONS:
+            return
+        # Never close a connection a with-block is still using
+        if path != keep and path != DB_PATH and pool.depth[path] == 0:
+            pool.connections.pop(path).close()
+            del pool.depth[path]
+
+
+@contextmanager
+def get_connection(db_path=None):
+    """
+    Yield this thread's pooled connection.
+
+    The outermost block commits on success and rolls back on error; nested
+    blocks run inside a SAVEPOINT so a failing inner block only undoes its
+    own work. The connection itself stays open for the next caller on the
+    same thread. Yields None if the database cannot be opened.
+    """
+    db_path = db_path or DB_PATH
+    conn = _pooled_connection(db_path)
+    if conn is None:
+        yield None
         return
-    cursor = conn.cursor()
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        email TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL
-    );
-    """)
 
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS suppliers (
-        supplier_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        supplier_name TEXT NOT NULL,
-        office_id TEXT,
-        user_id TEXT,
-        password TEXT NOT NULL,
-        url TEXT,
-        date_created TEXT DEFAULT CURRENT_TIMESTAMP,
-        last_reset TEXT,
-        owner_user_id INTEGER NOT NULL,
-        FOREIGN KEY (owner_user_id) REFERENCES users(user_id)
+    pool = _pool()
+    pool.depth[db_path] += 1
+    depth = pool.depth[db_path]
+    savepoint = f"sp_{depth}" if depth > 1 else None
+    if savepoint:
+        # A SAVEPOINT outside a transaction would start (and its RELEASE
+        # commit) one of its own; open it here so only the outermost block commits.
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        conn.execute(f"SAVEPOINT {savepoint}")
+    try:
+        yield conn
+        if savepoint:
+            conn.execute(f"RELEASE {savepoint}")
+        elif conn.in_transaction:
+            conn.commit()
+    except BaseException:
+        if savepoint:
+            conn.execute(f"ROLLBACK TO {savepoint}")
+            conn.execute(f"RELEASE {savepoint}")
+        elif conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        pool.depth[db_path] -= 1
+
+
+def close_connections():
+    """Close every pooled connection owned by the calling thread."""
+    pool = _pool()
+    for conn in pool.connections.values():
+        conn.close()
+    pool.connections.clear()
+    pool.depth.clear()
+
+
+# ------------------ SHARD ROUTING ------------------
+_ready_shards = set()
+_ready_shards_lock = threading.Lock()
+
+
+def shard_file(owner_user_id):
+    """Path of the database file that holds owner_user_id's suppliers."""
+    if SHARD_MODE == "owner":
+        return os.path.join(SHARD_DIR, f"owner-{int(owner_user_id)}.db")
+    if SHARD_MODE == "hash":
+        return os.path.join(SHARD_DIR, f"shard-{int(owner_user_id) % SHARD_COUNT:03d}.db")
+    return DB_PATH
+
+
+def _prepare_shard(db_path):
+    # Shards are created and migrated on first use, once per process
+    if db_path == DB_PATH or db_path in _ready_shards:
+        return db_path
+    with _ready_shards_lock:
+        if db_path not in _ready_shards:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            run_migrations(db_path, SHARD_MIGRATIONS)
+            _ready_shards.add(db_path)
+    return db_path
+
+
+def shard_for(owner_user_id):
+    """Like shard_file(), but creates and migrates the shard if needed."""
+    return _prepare_shard(shard_file(owner_user_id))
+
+
+def shard_paths():
+    """Every database file that holds suppliers, for jobs that sweep all owners."""
+    if SHARD_MODE not in ("owner", "hash"):
+        return [DB_PATH]
+    if not os.path.isdir(SHARD_DIR):
+        return []
+    prefix = "owner-" if SHARD_MODE == "owner" else "shard-"
+    names = sorted(name for name in os.listdir(SHARD_DIR) if name.startswith(prefix) and name.endswith(".db"))
+    return [_prepare_shard(os.path.join(SHARD_DIR, name)) for name in names]
+
+
+@contextmanager
+def get_shard_connection(owner_user_id):
+    """get_connection() for the database holding owner_user_id's suppliers."""
+    with get_connection(shard_for(owner_user_id)) as conn:
+        yield conn
+
+
+# Ordered schema migrations: (version, statements). Append new entries only;
+# never edit one that has shipped.
+MIGRATIONS = [
+    (1, [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS suppliers (
+            supplier_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            supplier_name TEXT NOT NULL,
+            office_id TEXT,
+            user_id TEXT,
+            password TEXT NOT NULL,
+            url TEXT,
+            date_created TEXT DEFAULT CURRENT_TIMESTAMP,
+            last_reset TEXT,
+            owner_user_id INTEGER NOT NULL,
+            FOREIGN KEY (owner_user_id) REFERENCES users(user_id)
+        );
+        """,
+    ]),
+    (2, [
+        # Supplier listing: WHERE owner_user_id = ? ORDER BY date_created DESC
+        """
+        CREATE INDEX IF NOT EXISTS idx_suppliers_owner_created
+        ON suppliers (owner_user_id, date_created, supplier_id);
+        """,
+        # Password reset reminders: WHERE owner_user_id = ? on last_reset
+        """
+        CREATE INDEX IF NOT EXISTS idx_suppliers_owner_reset
+        ON suppliers (owner_user_id, last_reset, supplier_name);
+        """,
+    ]),
+    (3, [
+        # Passwords expire 30 days after last_reset. The expiry is derived by
+        # SQLite itself and materialised in the index, so reminder lookups are
+        # a range scan and can never drift out of sync with last_reset.
+        """
+        ALTER TABLE suppliers ADD COLUMN password_expires_at TEXT
+        GENERATED ALWAYS AS (datetime(last_reset, '+30 days')) VIRTUAL;
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_suppliers_owner_expiry
+        ON suppliers (owner_user_id, password_expires_at);
+        """,
+    ]),
+    (4, [
+        # Cross-tenant reminder digest sweep: WHERE password_expires_at BETWEEN ...
+        """
+        CREATE INDEX IF NOT EXISTS idx_suppliers_expiry
+        ON suppliers (password_expires_at, owner_user_id);
+        """,
+        # One row per digest run; lets exactly one worker claim each day.
+        """
+        CREATE TABLE IF NOT EXISTS reminder_digest_runs (
+            run_date TEXT PRIMARY KEY,
+            started_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            emails_sent INTEGER DEFAULT 0
+        );
+        """,
+    ]),
+    (5, [
+        # Full-text index over the searchable supplier fields. owner_user_id is
+        # indexed too so per-tenant filtering happens inside the FTS query.
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS suppliers_fts USING fts5(
+            supplier_name, office_id, user_id, url, owner_user_id,
+            content='suppliers', content_rowid='supplier_id', prefix='2 3'
+        );
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS suppliers_fts_insert AFTER INSERT ON suppliers BEGIN
+            INSERT INTO suppliers_fts (rowid, supplier_name, office_id, user_id, url, owner_user_id)
+            VALUES (new.supplier_id, new.supplier_name, new.office_id, new.user_id, new.url, new.owner_user_id);
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS suppliers_fts_delete AFTER DELETE ON suppliers BEGIN
+            INSERT INTO suppliers_fts (suppliers_fts, rowid, supplier_name, office_id, user_id, url, owner_user_id)
+            VALUES ('delete', old.supplier_id, old.supplier_name, old.office_id, old.user_id, old.url, old.owner_user_id);
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS suppliers_fts_update
+        AFTER UPDATE OF supplier_name, office_id, user_id, url, owner_user_id ON suppliers BEGIN
+            INSERT INTO suppliers_fts (suppliers_fts, rowid, supplier_name, office_id, user_id, url, owner_user_id)
+            VALUES ('delete', old.supplier_id, old.supplier_name, old.office_id, old.user_id, old.url, old.owner_user_id);
+            INSERT INTO suppliers_fts (rowid, supplier_name, office_id, user_id, url, owner_user_id)
+            VALUES (new.supplier_id, new.supplier_name, new.office_id, new.user_id, new.url, new.owner_user_id);
+        END;
+        """,
+        "INSERT INTO suppliers_fts (suppliers_fts) VALUES ('rebuild');",
+    ]),
+    (6, [
+        # Bumped by every supplier write; lets each process's listing cache
+        # detect changes made by other workers.
+        """
+        CREATE TABLE IF NOT EXISTS supplier_cache_versions (
+            owner_user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        );
+        """,
+    ]),
+    (7, [
+        # Bulk imports insert a row here inside their own transaction (so no
+        # other connection ever sees it) to skip the per-row FTS trigger, then
+        # index all new rows with one INSERT ... SELECT before committing.
+        """
+        CREATE TABLE IF NOT EXISTS fts_sync_paused (
+            paused INTEGER PRIMARY KEY
+        );
+        """,
+        "DROP TRIGGER IF EXISTS suppliers_fts_insert;",
+        """
+        CREATE TRIGGER suppliers_fts_insert AFTER INSERT ON suppliers
+        WHEN NOT EXISTS (SELECT 1 FROM fts_sync_paused) BEGIN
+            INSERT INTO suppliers_fts (rowid, supplier_name, office_id, user_id, url, owner_user_id)
+            VALUES (new.supplier_id, new.supplier_name, new.office_id, new.user_id, new.url, new.owner_user_id);
+        END;
+        """,
+    ]),
+    (8, [
+        # Shared OTP store (OTP_STORE=sqlite); only code hashes are kept.
+        """
+        CREATE TABLE IF NOT EXISTS otp_codes (
+            purpose TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            code_hash TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (purpose, subject)
+        ) WITHOUT ROWID;
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_otp_codes_expiry ON otp_codes (expires_at);",
+    ]),
+    (9, [
+        # Shared token buckets (RATE_LIMIT_STORE=sqlite)
+        """
+        CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+            bucket_key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        ) WITHOUT ROWID;
+        """,
+    ]),
+    (10, [
+        # Soft delete: a tombstone timestamp, purged later by supplier_trash.py
+        "ALTER TABLE suppliers ADD COLUMN deleted_at TEXT;",
+        # Live-row queries all filter on deleted_at IS NULL, so the listing and
+        # expiry indexes become partial indexes that skip trashed rows.
+        "DROP INDEX IF EXISTS idx_suppliers_owner_created;",
+        """
+        CREATE INDEX IF NOT EXISTS idx_suppliers_live_owner_created
+        ON suppliers (owner_user_id, date_created, supplier_id) WHERE deleted_at IS NULL;
+        """,
+        "DROP INDEX IF EXISTS idx_suppliers_owner_expiry;",
+        """
+        CREATE INDEX IF NOT EXISTS idx_suppliers_live_owner_expiry
+        ON suppliers (owner_user_id, password_expires_at) WHERE deleted_at IS NULL;
+        """,
+        "DROP INDEX IF EXISTS idx_suppliers_expiry;",
+        """
+        CREATE INDEX IF NOT EXISTS idx_suppliers_live_expiry
+        ON suppliers (password_expires_at, owner_user_id) WHERE deleted_at IS NULL;
+        """,
+        # Purge scan: WHERE deleted_at IS NOT NULL AND deleted_at <= ?
+        """
+        CREATE INDEX IF NOT EXISTS idx_suppliers_trash
+        ON suppliers (deleted_at) WHERE deleted_at IS NOT NULL;
+        """,
+    ]),
+    (11, [
+        # Server-side sessions (SESSION_STORE=sqlite); keyed by a hash of the cookie id
+        """
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_key TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID;
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_sessions_expiry ON sessions (expires_at);",
+    ]),
+    (12, [
+        # Reminders range-scan password_expires_at (idx_suppliers_live_owner_expiry);
+        # nothing reads this index any more, but every write still paid for it.
+        "DROP INDEX IF EXISTS idx_suppliers_owner_reset;",
+    ]),
+    (13, [
+        # A digest run is only done once every email went out; until then a
+        # worker holds it through claimed_until and mailed users are recorded.
+        "ALTER TABLE reminder_digest_runs ADD COLUMN claimed_until REAL;",
+        "ALTER TABLE reminder_digest_runs ADD COLUMN completed_at TEXT;",
+        "UPDATE reminder_digest_runs SET completed_at = started_at;",
+        """
+        CREATE TABLE IF NOT EXISTS reminder_digest_sent (
+            run_date TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            PRIMARY KEY (run_date, user_id)
+        ) WITHOUT ROWID;
+        """,
+    ]),
+    (14, [
+        # Background import progress, readable from any worker
+        """
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            job_id TEXT PRIMARY KEY,
+            owner_user_id INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            status TEXT NOT NULL,
+            accepted INTEGER NOT NULL DEFAULT 0,
+            rejected INTEGER NOT NULL DEFAULT 0,
+            rows_per_second REAL NOT NULL DEFAULT 0,
+            errors TEXT NOT NULL DEFAULT '[]',
+            message TEXT NOT NULL DEFAULT '',
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_import_jobs_owner ON import_jobs (owner_user_id, created_at);",
+        "CREATE INDEX IF NOT EXISTS idx_import_jobs_status ON import_jobs (status, updated_at);",
+    ]),
+]
+
+# Schema of shard files (SHARD_MODE): only the supplier tables, as they stand
+# after MIGRATIONS, minus the foreign key to users, which lives in DB_PATH.
+# A migration that changes the supplier tables needs an entry here too.
+SHARD_MIGRATIONS = [
+    (1, [
+        """
+        CREATE TABLE IF NOT EXISTS suppliers (
+            supplier_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            supplier_name TEXT NOT NULL,
+            office_id TEXT,
+            user_id TEXT,
+            password TEXT NOT NULL,
+            url TEXT,
+            date_created TEXT DEFAULT CURRENT_TIMESTAMP,
+            last_reset TEXT,
+            owner_user_id INTEGER NOT NULL,
+            password_expires_at TEXT GENERATED ALWAYS AS (datetime(last_reset, '+30 days')) VIRTUAL,
+            deleted_at TEXT
+        );
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_suppliers_live_owner_created
+        ON suppliers (owner_user_id, date_created, supplier_id) WHERE deleted_at IS NULL;
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_suppliers_live_owner_expiry
+        ON suppliers (owner_user_id, password_expires_at) WHERE deleted_at IS NULL;
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_suppliers_live_expiry
+        ON suppliers (password_expires_at, owner_user_id) WHERE deleted_at IS NULL;
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_suppliers_trash
+        ON suppliers (deleted_at) WHERE deleted_at IS NOT NULL;
+        """,
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS suppliers_fts USING fts5(
+            supplier_name, office_id, user_id, url, owner_user_id,
+            content='suppliers', content_rowid='supplier_id', prefix='2 3'
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS fts_sync_paused (
+            paused INTEGER PRIMARY KEY
+        );
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS suppliers_fts_insert AFTER INSERT ON suppliers
+        WHEN NOT EXISTS (SELECT 1 FROM fts_sync_paused) BEGIN
+            INSERT INTO suppliers_fts (rowid, supplier_name, office_id, user_id, url, owner_user_id)
+            VALUES (new.supplier_id, new.supplier_name, new.office_id, new.user_id, new.url, new.owner_user_id);
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS suppliers_fts_delete AFTER DELETE ON suppliers BEGIN
+            INSERT INTO suppliers_fts (suppliers_fts, rowid, supplier_name, office_id, user_id, url, owner_user_id)
+            VALUES ('delete', old.supplier_id, old.supplier_name, old.office_id, old.user_id, old.url, old.owner_user_id);
+        END;
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS suppliers_fts_update
+        AFTER UPDATE OF supplier_name, office_id, user_id, url, owner_user_id ON suppliers BEGIN
+            INSERT INTO suppliers_fts (suppliers_fts, rowid, supplier_name, office_id, user_id, url, owner_user_id)
+            VALUES ('delete', old.supplier_id, old.supplier_name, old.office_id, old.user_id, old.url, old.owner_user_id);
+            INSERT INTO suppliers_fts (rowid, supplier_name, office_id, user_id, url, owner_user_id)
+            VALUES (new.supplier_id, new.supplier_name, new.office_id, new.user_id, new.url, new.owner_user_id);
+        END;
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS supplier_cache_versions (
+            owner_user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        );
+        """,
+    ]),
+    (2, [
+        # Shards created before this dropped it too (see MIGRATIONS 12)
+        "DROP INDEX IF EXISTS idx_suppliers_owner_reset;",
+    ]),
+]
+
+
+def get_schema_version(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        applied_at TEXT DEFAULT CURRENT_TIMESTAMP
     );
     """)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def run_migrations(db_path=None, migrations=MIGRATIONS):
+    """
+    Bring the database up to the latest schema version.
 
-    conn.commit()
-    conn.close()
+    Safe to call on every start-up: each migration is applied once, inside
+    an IMMEDIATE transaction so concurrent workers do not race each other.
+    """
+    with get_connection(db_path) as conn:
+        if not conn:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        current = get_schema_version(conn)
+        for version, statements in migrations:
+            if version <= current:
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
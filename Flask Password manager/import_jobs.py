@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from db_utils import get_connection
+from supplier_functions import process_csv, process_excel
+
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "2"))
+# Imports waiting or running in this process; the upload lives on its disk
+MAX_PENDING_IMPORTS = int(os.getenv("MAX_PENDING_IMPORTS", "16"))
+# Finished jobs are kept this long so the dashboard can still show them.
+IMPORT_JOB_RETENTION_SECONDS = int(os.getenv("IMPORT_JOB_RETENTION_SECONDS", "3600"))
+
+JOB_COLUMNS = (
+    "job_id", "owner_user_id", "filename", "status", "accepted", "rejected",
+    "rows_per_second", "errors", "message", "created_at", "updated_at",
+)
+
+# Job state lives in the import_jobs table so any worker can report on a
+# job; only the worker that received the upload runs it.
+_executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="import")
+_pending = 0
+_lock = threading.Lock()
+
+
+def _public(row):
+    job = dict(zip(JOB_COLUMNS, row))
+    job["id"] = job.pop("job_id")
+    job["errors"] = json.loads(job["errors"])
+    return job
+
+
+def _update(job_id, **fields):
+    if "errors" in fields:
+        fields["errors"] = json.dumps(fields["errors"])
+    fields["updated_at"] = time.time()
+    with get_connection() as conn:
+        conn.execute(
+            f"UPDATE import_jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE job_id = ?",
+            (*fields.values(), job_id),
+        )
+
+
+def _prune():
+    cutoff = time.time() - IMPORT_JOB_RETENTION_SECONDS
+    with get_connection() as conn:
+        conn.execute(
+            "DELETE FROM import_jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (cutoff,)
+        )
+        # Left behind by a worker that exited mid-import
+        conn.execute(
+            """
+            UPDATE import_jobs SET status = 'failed', message = 'Import interrupted.', updated_at = ?
+            WHERE status IN ('queued', 'running') AND updated_at < ?
+            """,
+            (time.time(), cutoff),
+        )
+
+
+def _run(job_id, owner_user_id, filepath, filename):
+    global _pending
+    _update(job_id, status="running")
+
+    def progress(stats):
+        _update(
+            job_id,
+            accepted=stats["accepted"],
+            rejected=stats["rejected"],
+            rows_per_second=round(stats["rows_per_second"], 1),
+            errors=list(stats["errors"]),
+        )
+
+    try:
+        if filename.lower().endswith(".csv"):
+            success, msg, stats = process_csv(filepath, owner_user_id, progress=progress)
+        else:
+            success, msg, stats = process_excel(filepath, owner_user_id, progress=progress)
+
+        if stats:
+            progress(stats)
+        _update(job_id, status="done" if success else "failed", message=msg)
+    except Exception as e:
+        _update(job_id, status="failed", message=f"Import failed: {e}")
+    finally:
+        with _lock:
+            _pending -= 1
+        # The upload holds plaintext credentials; do not leave it on disk.
+        try:
+            os.remove(filepath)
+        except OSError:
+            pass
+
+
+def submit_import(owner_user_id, filepath, filename):
+    """
+    Queue an uploaded CSV/Excel file for background import.
+
+    Returns:
+        tuple: (job_id, message); job_id is None if the queue is full.
+    """
+    global _pending
+    with _lock:
+        if _pending >= MAX_PENDING_IMPORTS:
+            return None, "Too many imports in progress. Please try again shortly."
+        _pending += 1
+
+    try:
+        _prune()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with get_connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO import_jobs (job_id, owner_user_id, filename, status, created_at, updated_at)
+                VALUES (?, ?, ?, 'queued', ?, ?)
+                """,
+                (job_id, owner_user_id, filename, now, now),
+            )
+        _executor.submit(_run, job_id, owner_user_id, filepath, filename)
+    except BaseException:
+        with _lock:
+            _pending -= 1
+        raise
+    return job_id, f"Import of {filename} started."
+
+
+def get_import_job(owner_user_id, job_id):
+    """Return a snapshot of the job if it belongs to the user, else None."""
+    with get_connection() as conn:
+        row = conn.execute(
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM import_jobs WHERE job_id = ? AND owner_user_id = ?",
+            (job_id, owner_user_id),
+        ).fetchone()
+    return _public(row) if row else None
+
+
+def list_import_jobs(owner_user_id, limit=5):
+    """Most recent import jobs for the user, newest first."""
+    with get_connection() as conn:
+        rows = conn.execute(
+            f"""
+            SELECT {', '.join(JOB_COLUMNS)} FROM import_jobs
+            WHERE owner_user_id = ? ORDER BY created_at DESC LIMIT ?
+            """,
+            (owner_user_id, limit),
+        ).fetchall()
+    return [_public(row) for row in rows]
@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# In-process metrics, exported in the Prometheus text format by /metrics.
+# Each worker process keeps its own numbers; scrape every worker.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# If set, /metrics requires "Authorization: Bearer <token>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# name -> {"type", "help", "buckets", "series": {label items: value or [counts, sum, count]}}
+_metrics = {}
+_collectors = []
+_lock = threading.Lock()
+
+
+def _metric(name, kind, help_text, buckets=None):
+    metric = _metrics.get(name)
+    if metric is None:
+        metric = _metrics[name] = {"type": kind, "help": help_text, "buckets": buckets, "series": {}}
+    return metric
+
+
+def observe(name, help_text, seconds, buckets=LATENCY_BUCKETS, **labels):
+    """Record one observation in a histogram."""
+    if not METRICS_ENABLED:
+        return
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        series = _metric(name, "histogram", help_text, buckets)["series"]
+        entry = series.get(key)
+        if entry is None:
+            # Per-bucket counts (+Inf last); made cumulative when rendered
+            entry = series[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(buckets, seconds)] += 1
+        entry[1] += seconds
+        entry[2] += 1
+
+
+def inc(name, help_text, amount=1, **labels):
+    """Add amount to a counter."""
+    if not METRICS_ENABLED:
+        return
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        series = _metric(name, "counter", help_text)["series"]
+        series[key] = series.get(key, 0) + amount
+
+
+@contextmanager
+def timed(name, help_text, buckets=LATENCY_BUCKETS, **labels):
+    """Observe the duration of the with-block in a histogram."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, help_text, time.perf_counter() - started, buckets, **labels)
+
+
+def register_collector(collector):
+    """
+    Add a callable polled on every scrape for values owned elsewhere.
+
+    It returns an iterable of (name, type, help, [(labels_dict, value), ...]).
+    """
+    _collectors.append(collector)
+    return collector
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(items, extra=()):
+    items = list(items) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in items) + "}"
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+def render():
+    """Return every metric in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        snapshot = {
+            name: dict(metric, series={
+                key: ([list(entry[0]), entry[1], entry[2]] if metric["type"] == "histogram" else entry)
+                for key, entry in metric["series"].items()
+            })
+            for name, metric in _metrics.items()
+        }
+
+    for name in sorted(snapshot):
+        metric = snapshot[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for key, entry in sorted(metric["series"].items()):
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_labels(key)} {entry}")
+                continue
+            counts, total, count = entry
+            cumulative = 0
+            for bound, bucket_count in zip(list(metric["buckets"]) + [float("inf")], counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_labels(key, [('le', _format_bound(bound))])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(key)} {total}")
+            lines.append(f"{name}_count{_labels(key)} {count}")
+
+    for collector in _collectors:
+        try:
+            for name, kind, help_text, samples in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(sorted(labels.items()))} {value}")
+        except Exception as e:
+            print(f"Error collecting metrics: {e}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,153 @@
+import hashlib
+import hmac
+import os
+import threading
+import time
+
+from db_utils import get_connection, SHARED_STORE_DEFAULT
+from otp_utils import generate_otp
+
+# "memory" keeps codes in this process only; "sqlite" shares them between
+# workers through the otp_codes table (the default).
+OTP_STORE = os.getenv("OTP_STORE", SHARED_STORE_DEFAULT)
+OTP_TTL_SECONDS = int(os.getenv("OTP_TTL_SECONDS", "600"))
+OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", "5"))
+OTP_SWEEP_SECONDS = int(os.getenv("OTP_SWEEP_SECONDS", "60"))
+
+# (purpose, subject) -> [code_hash, expires_at, attempts]
+_codes = {}
+_lock = threading.Lock()
+_sweeper = None
+
+
+def _hash(code):
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def _key(purpose, subject):
+    return purpose, str(subject)
+
+
+def issue_otp(purpose, subject, ttl=OTP_TTL_SECONDS, code=None):
+    """
+    Create a fresh OTP for (purpose, subject), replacing any earlier one.
+
+    Only a hash of the code is stored. Returns the code to send to the user.
+    """
+    _ensure_sweeper()
+    code = code or generate_otp()
+    expires_at = time.time() + ttl
+    purpose, subject = _key(purpose, subject)
+
+    if OTP_STORE == "sqlite":
+        with get_connection() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO otp_codes (purpose, subject, code_hash, expires_at, attempts)
+                VALUES (?, ?, ?, ?, 0)
+                """,
+                (purpose, subject, _hash(code), expires_at),
+            )
+    else:
+        with _lock:
+            _codes[(purpose, subject)] = [_hash(code), expires_at, 0]
+    return code
+
+
+def verify_otp(purpose, subject, code, consume=True):
+    """
+    Check a submitted code.
+
+    Fails for missing, expired or exhausted codes; every wrong guess counts
+    towards OTP_MAX_ATTEMPTS. A correct code is removed when consume is set,
+    otherwise it stays valid until it expires.
+    """
+    if not code:
+        return False
+    purpose, subject = _key(purpose, subject)
+    now = time.time()
+
+    if OTP_STORE == "sqlite":
+        with get_connection() as conn:
+            row = conn.execute(
+                "SELECT code_hash, expires_at, attempts FROM otp_codes WHERE purpose = ? AND subject = ?",
+                (purpose, subject),
+            ).fetchone()
+            if not row or row[1] <= now or row[2] >= OTP_MAX_ATTEMPTS:
+                return False
+            if not hmac.compare_digest(row[0], _hash(code)):
+                conn.execute(
+                    "UPDATE otp_codes SET attempts = attempts + 1 WHERE purpose = ? AND subject = ?",
+                    (purpose, subject),
+                )
+                return False
+            if consume:
+                conn.execute("DELETE FROM otp_codes WHERE purpose = ? AND subject = ?", (purpose, subject))
+            return True
+
+    with _lock:
+        entry = _codes.get((purpose, subject))
+        if not entry or entry[1] <= now or entry[2] >= OTP_MAX_ATTEMPTS:
+            return False
+        if not hmac.compare_digest(entry[0], _hash(code)):
+            entry[2] += 1
+            return False
+        if consume:
+            del _codes[(purpose, subject)]
+        return True
+
+
+def has_live_otp(purpose, subject):
+    """True if (purpose, subject) has an unexpired code with attempts left."""
+    purpose, subject = _key(purpose, subject)
+    now = time.time()
+    if OTP_STORE == "sqlite":
+        with get_connection() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM otp_codes WHERE purpose = ? AND subject = ? AND expires_at > ? AND attempts < ?",
+                (purpose, subject, now, OTP_MAX_ATTEMPTS),
+            ).fetchone()
+        return row is not None
+    with _lock:
+        entry = _codes.get((purpose, subject))
+        return bool(entry) and entry[1] > now and entry[2] < OTP_MAX_ATTEMPTS
+
+
+def revoke_otp(purpose, subject):
+    purpose, subject = _key(purpose, subject)
+    if OTP_STORE == "sqlite":
+        with get_connection() as conn:
+            conn.execute("DELETE FROM otp_codes WHERE purpose = ? AND subject = ?", (purpose, subject))
+    else:
+        with _lock:
+            _codes.pop((purpose, subject), None)
+
+
+def evict_expired():
+    """Remove expired codes; returns how many were dropped."""
+    now = time.time()
+    if OTP_STORE == "sqlite":
+        with get_connection() as conn:
+            return conn.execute("DELETE FROM otp_codes WHERE expires_at <= ?", (now,)).rowcount
+    with _lock:
+        expired = [key for key, entry in _codes.items() if entry[1] <= now]
+        for key in expired:
+            del _codes[key]
+    return len(expired)
+
+
+def _sweep_loop():
+    while True:
+        time.sleep(OTP_SWEEP_SECONDS)
+        try:
+            evict_expired()
+        except Exception as e:
+            print(f"Error evicting expired OTPs: {e}")
+
+
+def _ensure_sweeper():
+    global _sweeper
+    with _lock:
+        if _sweeper is None or not _sweeper.is_alive():
+            _sweeper = threading.Thread(target=_sweep_loop, name="otp-sweeper", daemon=True)
+            _sweeper.start()
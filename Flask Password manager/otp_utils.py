@@ -1,34 +1,184 @@
+import heapq
+import itertools
 import os
-import random
+import queue
+import secrets
 import smtplib
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
 
+import metrics
+
 load_dotenv()
 
 EMAIL_HOST = os.getenv("EMAIL_HOST")
 EMAIL_PORT = os.getenv("EMAIL_PORT")
 EMAIL_USER = os.getenv("EMAIL_USER")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "1") != "0"
+
+# Outbox tuning
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", "1"))
+MAIL_QUEUE_SIZE = int(os.getenv("MAIL_QUEUE_SIZE", "1000"))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "5"))
+MAIL_RETRY_BASE_SECONDS = float(os.getenv("MAIL_RETRY_BASE_SECONDS", "1"))
+MAIL_IDLE_SECONDS = float(os.getenv("MAIL_IDLE_SECONDS", "30"))
+
+_outbox = queue.Queue(maxsize=MAIL_QUEUE_SIZE)
+# Failed sends waiting out their backoff: (due_time, order, to_email, message, attempts)
+_retries = []
+_retries_lock = threading.Lock()
+_retry_order = itertools.count()
+_workers = []
+_workers_lock = threading.Lock()
 
 def generate_otp(length=6):
-    return ''.join(random.choices("0123456789", k=length))
+    return ''.join(secrets.choice("0123456789") for _ in range(length))
+
+def _build_otp_message(to_email, otp_code):
+    msg = MIMEMultipart()
+    msg['From'] = EMAIL_USER
+    msg['To'] = to_email
+    msg['Subject'] = "Your OTP Code"
+    body = f"Your OTP is {otp_code}. It will expire shortly."
+    msg.attach(MIMEText(body, 'plain'))
+    return msg.as_string()
+
+def open_smtp_session():
+    """Connect, upgrade to TLS and authenticate against the configured SMTP server."""
+    server = smtplib.SMTP(EMAIL_HOST, int(EMAIL_PORT), timeout=30)
+    if EMAIL_USE_TLS:
+        server.starttls()
+    if EMAIL_USER and EMAIL_PASSWORD:
+        server.login(EMAIL_USER, EMAIL_PASSWORD)
+    return server
+
+def _close_smtp_session(server):
+    try:
+        server.quit()
+    except Exception:
+        server.close()
+
+OTP_EMAIL_SECONDS = "passman_otp_email_send_seconds"
+OTP_EMAIL_HELP = "Time spent handing OTP emails to SMTP (sync: one session per email; queue: outbox workers)."
+OTP_EMAIL_FAILURES = "passman_otp_email_failures_total"
+OTP_EMAIL_FAILURES_HELP = "OTP email send attempts that failed."
 
 def send_otp_via_email(to_email, otp_code):
     try:
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_USER
-        msg['To'] = to_email
-        msg['Subject'] = "Your OTP Code"
-        body = f"Your OTP is {otp_code}. It will expire shortly."
-        msg.attach(MIMEText(body, 'plain'))
-
-        with smtplib.SMTP(EMAIL_HOST, int(EMAIL_PORT)) as server:
-            server.starttls()
-            server.login(EMAIL_USER, EMAIL_PASSWORD)
-            server.sendmail(EMAIL_USER, to_email, msg.as_string())
+        with metrics.timed(OTP_EMAIL_SECONDS, OTP_EMAIL_HELP, mode="sync"):
+            server = open_smtp_session()
+            try:
+                server.sendmail(EMAIL_USER, to_email, _build_otp_message(to_email, otp_code))
+            finally:
+                _close_smtp_session(server)
         return True
     except Exception as e:
         print(f"Error sending email: {e}")
+        metrics.inc(OTP_EMAIL_FAILURES, OTP_EMAIL_FAILURES_HELP, mode="sync")
+        return False
+
+# ------------------ OUTBOX ------------------
+def _schedule_retry(to_email, message, attempts):
+    if attempts >= MAIL_MAX_ATTEMPTS:
+        print(f"Error sending email to {to_email}: giving up after {attempts} attempts")
+        return
+    delay = MAIL_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+    # Picked up by the mail workers once due; no thread per pending retry
+    with _retries_lock:
+        if len(_retries) >= MAIL_QUEUE_SIZE:
+            print(f"Error sending email to {to_email}: retry queue full, dropping retry")
+            return
+        heapq.heappush(_retries, (time.monotonic() + delay, next(_retry_order), to_email, message, attempts))
+
+def _due_retries(limit):
+    """Pop up to limit retries whose backoff has passed; also return seconds until the next one (or None)."""
+    now = time.monotonic()
+    due = []
+    with _retries_lock:
+        while _retries and _retries[0][0] <= now and len(due) < limit:
+            _, _, to_email, message, attempts = heapq.heappop(_retries)
+            due.append((to_email, message, attempts, False))
+        wait = _retries[0][0] - now if _retries else None
+    return due, wait
+
+def _mail_worker():
+    """
+    Drain the outbox over one long-lived SMTP session.
+
+    Messages are taken in batches and sent back to back on the same session;
+    due retries go first. The session is dropped after MAIL_IDLE_SECONDS
+    without traffic or on any SMTP error, and reopened for the next message.
+    """
+    server = None
+    last_used = time.monotonic()
+    while True:
+        batch, retry_wait = _due_retries(MAIL_BATCH_SIZE)
+        if not batch:
+            # Wake up in time for the next retry even if nothing new arrives
+            timeout = MAIL_IDLE_SECONDS if retry_wait is None else min(MAIL_IDLE_SECONDS, retry_wait)
+            try:
+                to_email, message, attempts = _outbox.get(timeout=max(timeout, 0.01))
+                batch = [(to_email, message, attempts, True)]
+            except queue.Empty:
+                if server and time.monotonic() - last_used >= MAIL_IDLE_SECONDS:
+                    _close_smtp_session(server)
+                    server = None
+                continue
+
+        while len(batch) < MAIL_BATCH_SIZE:
+            try:
+                to_email, message, attempts = _outbox.get_nowait()
+                batch.append((to_email, message, attempts, True))
+            except queue.Empty:
+                break
+
+        for to_email, message, attempts, from_outbox in batch:
+            try:
+                with metrics.timed(OTP_EMAIL_SECONDS, OTP_EMAIL_HELP, mode="queue"):
+                    if server is None:
+                        server = open_smtp_session()
+                    server.sendmail(EMAIL_USER, to_email, message)
+            except Exception as e:
+                print(f"Error sending email: {e}")
+                metrics.inc(OTP_EMAIL_FAILURES, OTP_EMAIL_FAILURES_HELP, mode="queue")
+                if server:
+                    server.close()
+                    server = None
+                _schedule_retry(to_email, message, attempts + 1)
+            finally:
+                if from_outbox:
+                    _outbox.task_done()
+        last_used = time.monotonic()
+
+def _ensure_mail_workers():
+    with _workers_lock:
+        # Threads do not survive a fork, so check liveness rather than count.
+        _workers[:] = [worker for worker in _workers if worker.is_alive()]
+        while len(_workers) < MAIL_WORKERS:
+            worker = threading.Thread(target=_mail_worker, name="otp-mailer", daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+def outbox_size():
+    with _retries_lock:
+        return _outbox.qsize() + len(_retries)
+
+def queue_otp_email(to_email, otp_code):
+    """
+    Queue an OTP email for background delivery.
+
+    Returns True once the message is enqueued, False if the outbox is full.
+    Delivery failures are retried with exponential backoff.
+    """
+    _ensure_mail_workers()
+    try:
+        _outbox.put_nowait((to_email, _build_otp_message(to_email, otp_code), 0))
+        return True
+    except queue.Full:
+        print(f"Error queueing email to {to_email}: outbox full")
         return False
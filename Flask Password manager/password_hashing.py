@@ -0,0 +1,112 @@
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# scrypt cost parameters. Raising any of them makes new hashes stronger;
+# existing hashes are upgraded transparently on the user's next login.
+SCRYPT_N = int(os.getenv("SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.getenv("SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("SCRYPT_P", "1"))
+SCRYPT_SALT_BYTES = 16
+SCRYPT_KEY_BYTES = 32
+
+# Size of the hashing process pool; 0 hashes inline in the calling thread.
+# Each web worker process gets its own pool, so a server with W workers runs
+# up to W * HASH_WORKERS hashing processes; keep W * HASH_WORKERS near the
+# core count.
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(2, os.cpu_count() or 1))))
+
+HASH_PREFIX = "scrypt"
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(
+        password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+        maxmem=256 * n * r * p, dklen=SCRYPT_KEY_BYTES,
+    )
+
+
+def _executor():
+    global _pool, _pool_pid
+    with _pool_lock:
+        # A forked worker cannot use its parent's pool.
+        if _pool is None or _pool_pid != os.getpid():
+            # Never fork: this process already runs background threads (mail,
+            # purge, sweepers) and a forked child could inherit a held lock.
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            context = multiprocessing.get_context(method)
+            if method == "forkserver":
+                # The default preload imports __main__ (app.py), which would
+                # run migrations and start schedulers in the fork server.
+                context.set_forkserver_preload(["password_hashing"])
+            _pool = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=context)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _run(password, salt, n, r, p):
+    if HASH_WORKERS <= 0:
+        return _scrypt(password, salt, n, r, p)
+    return _executor().submit(_scrypt, password, salt, n, r, p).result()
+
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def hash_password(password):
+    """Return an encoded scrypt hash: scrypt$n$r$p$salt$key."""
+    salt = secrets.token_bytes(SCRYPT_SALT_BYTES)
+    key = _run(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"{HASH_PREFIX}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(key)}"
+
+
+def verify_password(password, stored):
+    """
+    Check a password against a stored value.
+
+    Legacy rows hold the plain password; they still verify, but are
+    reported as needing a rehash, as are hashes made with older parameters.
+
+    Returns:
+        tuple: (matches, needs_rehash)
+    """
+    if not stored.startswith(HASH_PREFIX + "$"):
+        return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8")), True
+
+    try:
+        _, n, r, p, salt, key = stored.split("$")
+        n, r, p = int(n), int(r), int(p)
+        salt, key = base64.b64decode(salt), base64.b64decode(key)
+    except ValueError:
+        return False, False
+
+    matches = hmac.compare_digest(_run(password, salt, n, r, p), key)
+    needs_rehash = (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return matches, needs_rehash
+
+
+if __name__ == "__main__":
+    # Login throughput: python password_hashing.py [concurrent_logins]
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    stored = hash_password("benchmark-password")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(HASH_WORKERS, 1) * 2) as threads:
+        list(threads.map(lambda _: verify_password("benchmark-password", stored), range(logins)))
+    elapsed = time.perf_counter() - started
+    workers = max(HASH_WORKERS, 1)
+    print(f"scrypt n={SCRYPT_N} r={SCRYPT_R} p={SCRYPT_P}, {workers} worker(s)")
+    print(f"{logins / elapsed:.1f} logins/s total, {logins / elapsed / workers:.1f} logins/s per core")
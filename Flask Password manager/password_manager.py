@@ -1,9 +1,7 @@
-import sqlite3
 import os
 import smtplib
 import random
 import string
-import csv
 import unicodedata
 from datetime import datetime, timedelta
 from email.mime.text import MIMEText
@@ -12,6 +10,17 @@ from email.mime.multipart import MIMEMultipart
 # pip install python-dotenv
 from dotenv import load_dotenv
 
+from db_utils import get_connection, get_shard_connection, run_migrations
+from password_hashing import hash_password, verify_password
+from supplier_crypto import check_master_key, encrypt_password, decrypt_password
+from supplier_functions import (
+    process_csv,
+    search_suppliers,
+    bump_supplier_version,
+    view_password_reset_reminders as get_password_reset_reminders,
+)
+from supplier_export import export_to_file
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -21,58 +30,6 @@ EMAIL_USER = os.getenv("EMAIL_USER")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
 
 
-# ------------------ DATABASE SETUP ------------------
-def create_connection():
-    """
-    Create a database connection to the SQLite database
-    """
-    conn = None
-    try:
-        conn = sqlite3.connect("password_manager.db")
-        # Enforce foreign key constraints
-        conn.execute("PRAGMA foreign_keys = 1;")
-        return conn
-    except sqlite3.Error as e:
-        print(f"Error creating DB connection: {e}")
-    return conn
-
-def create_tables():
-    """
-    Create the necessary tables in the SQLite database if not present
-    """
-    conn = create_connection()
-    cursor = conn.cursor()
-
-    # Create users table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        email TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL
-    );
-    """)
-
-    # Create suppliers table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS suppliers (
-        supplier_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        supplier_name TEXT NOT NULL,
-        office_id TEXT,
-        user_id TEXT,     -- Not to be confused with users.user_id, we'll just store it as text or int
-        password TEXT NOT NULL,
-        url TEXT,
-        date_created TEXT DEFAULT CURRENT_TIMESTAMP,
-        last_reset TEXT,
-        owner_user_id INTEGER NOT NULL,
-        FOREIGN KEY (owner_user_id) REFERENCES users(user_id)
-    );
-    """)
-
-    conn.commit()
-    conn.close()
-
-
 # ------------------ OTP & EMAIL ------------------
 def generate_otp(length=6):
     """Generate a numeric OTP code of given length."""
@@ -109,34 +66,32 @@ def register():
     Handle user registration.
     - Username must be unique
     - Email must be unique
-    - Password stored as plain text here for simplicity (use hashing in production)
+    - Password stored as a salted scrypt hash
     """
-    conn = create_connection()
-    cursor = conn.cursor()
-
-    print("\n--- Registration ---")
-    while True:
-        username = input("Enter a unique username: ").strip()
-        email = input("Enter your email: ").strip()
-        password = input("Enter your password: ").strip()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-        # Check uniqueness
-        cursor.execute("SELECT * FROM users WHERE username = ? OR email = ?", (username, email))
-        row = cursor.fetchone()
+        print("\n--- Registration ---")
+        while True:
+            username = input("Enter a unique username: ").strip()
+            email = input("Enter your email: ").strip()
+            password = input("Enter your password: ").strip()
 
-        if row:
-            print("Error: That username or email is already registered. Please try again.")
-        else:
-            # Insert new user
-            cursor.execute("""
-                INSERT INTO users (username, email, password) 
-                VALUES (?, ?, ?)
-            """, (username, email, password))
-            conn.commit()
-            print("Registration successful!\n")
-            break
+            # Check uniqueness
+            cursor.execute("SELECT * FROM users WHERE username = ? OR email = ?", (username, email))
+            row = cursor.fetchone()
 
-    conn.close()
+            if row:
+                print("Error: That username or email is already registered. Please try again.")
+            else:
+                # Insert new user
+                cursor.execute("""
+                    INSERT INTO users (username, email, password) 
+                    VALUES (?, ?, ?)
+                """, (username, email, hash_password(password)))
+                conn.commit()
+                print("Registration successful!\n")
+                break
 
 
 def sign_in():
@@ -144,65 +99,65 @@ def sign_in():
     Handle user sign in.
     - If the user types the wrong password twice, prompt for reset or try again or exit.
     """
-    conn = create_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    print("\n--- Sign In ---")
-    username = input("Username: ").strip()
+        print("\n--- Sign In ---")
+        username = input("Username: ").strip()
 
-    # Check if user exists
-    cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
-    user_data = cursor.fetchone()
+        # Check if user exists
+        cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
+        user_data = cursor.fetchone()
 
-    if not user_data:
-        print("No such user found. Please register first.")
-        conn.close()
-        return None
+        if not user_data:
+            print("No such user found. Please register first.")
+            return None
 
-    # user_data layout: (user_id, username, email, password)
-    user_id, db_username, db_email, db_password = user_data
+        # user_data layout: (user_id, username, email, password)
+        user_id, db_username, db_email, db_password = user_data
 
-    attempts = 0
-    while True:
-        password = input("Password: ").strip()
-        if password == db_password:
-            print("Sign in successful!")
-            conn.close()
-            return user_data
-        else:
-            attempts += 1
-            print("Incorrect password.")
-            if attempts == 2:
-                print("\nYou have entered the wrong password twice.")
-                print("Options:")
-                print("1. Reset password")
-                print("2. Try again")
-                print("3. Exit")
-                opt = input("Enter choice: ").strip()
-                if opt == '1':
-                    # Reset password flow
-                    # 1) Send OTP to user email
-                    print("Sending OTP to your registered email address...")
-                    otp_code = generate_otp()
-                    if send_otp_via_email(db_email, otp_code):
-                        # 2) Ask user to enter OTP
-                        user_otp = input("Enter the OTP sent to your email: ").strip()
-                        if user_otp == otp_code:
-                            new_pass = input("Enter your new password: ").strip()
-                            cursor.execute("UPDATE users SET password = ? WHERE user_id = ?", (new_pass, user_id))
-                            conn.commit()
-                            print("Password has been reset. Please sign in again.")
-                        else:
-                            print("OTP mismatch. Returning to Welcome Screen.")
-                    conn.close()
-                    return None
-                elif opt == '2':
-                    # reset attempts and keep going
-                    attempts = 0
-                else:
-                    # Exit
-                    conn.close()
-                    return None
+        attempts = 0
+        while True:
+            password = input("Password: ").strip()
+            matches, needs_rehash = verify_password(password, db_password)
+            if matches:
+                if needs_rehash:
+                    cursor.execute("UPDATE users SET password = ? WHERE user_id = ?", (hash_password(password), user_id))
+                    conn.commit()
+                print("Sign in successful!")
+                return user_data
+            else:
+                attempts += 1
+                print("Incorrect password.")
+                if attempts == 2:
+                    print("\nYou have entered the wrong password twice.")
+                    print("Options:")
+                    print("1. Reset password")
+                    print("2. Try again")
+                    print("3. Exit")
+                    opt = input("Enter choice: ").strip()
+                    if opt == '1':
+                        # Reset password flow
+                        # 1) Send OTP to user email
+                        print("Sending OTP to your registered email address...")
+                        otp_code = generate_otp()
+                        if send_otp_via_email(db_email, otp_code):
+                            # 2) Ask user to enter OTP
+                            user_otp = input("Enter the OTP sent to your email: ").strip()
+                            if user_otp == otp_code:
+                                new_pass = input("Enter your new password: ").strip()
+                                cursor.execute("UPDATE users SET password = ? WHERE user_id = ?", (hash_password(new_pass), user_id))
+                                conn.commit()
+                                print("Password has been reset. Please sign in again.")
+                            else:
+                                print("OTP mismatch. Returning to Welcome Screen.")
+                        return None
+                    elif opt == '2':
+                        # reset attempts and keep going
+                        attempts = 0
+                    else:
+                        # Exit
+                        return None
 
 
 # ------------------ SUPPLIER MANAGEMENT ------------------
@@ -212,6 +167,21 @@ def parse_datetime(dt_string):
     except ValueError:
         return datetime.strptime(dt_string, "%Y-%m-%d %H:%M:%S")    # without microseconds
     
+def find_supplier_by_name(user_id, suppliers, user_input):
+    """
+    Resolve a typed supplier name to one of the listed supplier rows.
+
+    Uses the full-text index: an exact (case-insensitive) name match wins,
+    otherwise the best-ranked prefix match is taken.
+    """
+    matches = search_suppliers(user_id, user_input, limit=10)
+    exact = [m for m in matches if m.supplier_name.lower() == user_input.lower()]
+    best = (exact or matches)[:1]
+    if not best:
+        return None
+    by_id = {sup[0]: sup for sup in suppliers}
+    return by_id.get(best[0].id)
+
 def view_supplier_details(current_user):
     """
     1) Show all suppliers for this user.
@@ -219,92 +189,89 @@ def view_supplier_details(current_user):
     3) If there are suppliers, allow user to type the supplier name or serial no. to view details
     4) Mask password, and at the bottom ask if they want to unmask -> triggers OTP flow
     """
-    conn = create_connection()
-    cursor = conn.cursor()
-
-    user_id, username, email, _ = current_user
-
-    cursor.execute("""
-        SELECT supplier_id, supplier_name, office_id, user_id, password, url, last_reset
-        FROM suppliers
-        WHERE owner_user_id = ?
-    """, (user_id,))
-    suppliers = cursor.fetchall()
-
-    if not suppliers:
-        print("\nNo suppliers added yet.\n")
-        conn.close()
-        return
-
-    print("\n--- Your Suppliers ---")
-    print("S.No | Supplier Name")
-    print("--------------------")
-    for i, sup in enumerate(suppliers, start=1):
-        sup_id, sup_name, office_id, sup_user_id, pw, url, last_reset = sup
-        print(f"{i}. {sup_name}")
-
-    user_input = input("\nEnter S.No or Supplier Name to view details: ").strip()
-
-    # Identify the supplier based on user_input
-    selected_supplier = None
+    with get_shard_connection(current_user[0]) as conn:
+        cursor = conn.cursor()
+
+        user_id, username, email, _ = current_user
+
+        cursor.execute("""
+            SELECT supplier_id, supplier_name, office_id, user_id, password, url, last_reset
+            FROM suppliers
+            WHERE owner_user_id = ? AND deleted_at IS NULL
+        """, (user_id,))
+        suppliers = cursor.fetchall()
+
+        if not suppliers:
+            print("\nNo suppliers added yet.\n")
+            return
+
+        print("\n--- Your Suppliers ---")
+        print("S.No | Supplier Name")
+        print("--------------------")
+        for i, sup in enumerate(suppliers, start=1):
+            sup_id, sup_name, office_id, sup_user_id, pw, url, last_reset = sup
+            print(f"{i}. {sup_name}")
+
+        user_input = input("\nEnter S.No or Supplier Name to view details: ").strip()
+
+        # Identify the supplier based on user_input
+        selected_supplier = None
+
+        # If user_input is a digit, interpret as index
+        if user_input.isdigit():
+            index = int(user_input) - 1
+            if 0 <= index < len(suppliers):
+                selected_supplier = suppliers[index]
+        else:
+            selected_supplier = find_supplier_by_name(user_id, suppliers, user_input)
 
-    # If user_input is a digit, interpret as index
-    if user_input.isdigit():
-        index = int(user_input) - 1
-        if 0 <= index < len(suppliers):
-            selected_supplier = suppliers[index]
-    else:
-        # match by supplier name
-        for sup in suppliers:
-            if sup[1].lower() == user_input.lower():
-                selected_supplier = sup
-                break
+        if not selected_supplier:
+            print("Supplier not found.")
+            return
 
-    if not selected_supplier:
-        print("Supplier not found.")
-        conn.close()
-        return
+        sup_id, sup_name, office_id, sup_user_id, pw, url, last_reset = selected_supplier
+        try:
+            pw = decrypt_password(user_id, pw)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+
+        print(f"\nSupplier: {sup_name}")
+        if office_id:
+            print(f"Office ID: {office_id}")
+        else:
+            print("Office ID not Required")
+        print(f"User ID: {sup_user_id}")
+        print(f"Password: {'*' * len(pw)}")
+        print(f"Site URL: {url}")
+        print(f"Last Reset: {last_reset}")
+
+        # 30 day expiry - record is last_reset. If null, treat as never set
+        # For display of next reset reminder
+        if last_reset:
+            last_reset_dt = parse_datetime(last_reset)
+            next_reset_dt = last_reset_dt + timedelta(days=30)
+            reminder_dt = next_reset_dt - timedelta(days=7)
+            print(f"Password Reset Reminder: {reminder_dt}")
+        else:
+            print("Password Reset Reminder: Not set")
 
-    sup_id, sup_name, office_id, sup_user_id, pw, url, last_reset = selected_supplier
+        print("\n[1] Toggle Password Masking (10 min)")
+        print("[2] Return")
 
-    print(f"\nSupplier: {sup_name}")
-    if office_id:
-        print(f"Office ID: {office_id}")
-    else:
-        print("Office ID not Required")
-    print(f"User ID: {sup_user_id}")
-    print(f"Password: {'*' * len(pw)}")
-    print(f"Site URL: {url}")
-    print(f"Last Reset: {last_reset}")
-
-    # 30 day expiry - record is last_reset. If null, treat as never set
-    # For display of next reset reminder
-    if last_reset:
-        last_reset_dt = parse_datetime(last_reset)
-        next_reset_dt = last_reset_dt + timedelta(days=30)
-        reminder_dt = next_reset_dt - timedelta(days=7)
-        print(f"Password Reset Reminder: {reminder_dt}")
-    else:
-        print("Password Reset Reminder: Not set")
-
-    print("\n[1] Toggle Password Masking (10 min)")
-    print("[2] Return")
-
-    choice = input("Enter your choice: ").strip()
-    if choice == "1":
-        # OTP flow to unmask password
-        print("Sending OTP to your registered email address...")
-        otp_code = generate_otp()
-        if send_otp_via_email(email, otp_code):
-            user_otp = input("Enter the OTP sent to your email: ").strip()
-            if user_otp == otp_code:
-                print(f"Unmasked Password: {pw}")
+        choice = input("Enter your choice: ").strip()
+        if choice == "1":
+            # OTP flow to unmask password
+            print("Sending OTP to your registered email address...")
+            otp_code = generate_otp()
+            if send_otp_via_email(email, otp_code):
+                user_otp = input("Enter the OTP sent to your email: ").strip()
+                if user_otp == otp_code:
+                    print(f"Unmasked Password: {pw}")
+                else:
+                    print("OTP mismatch. Returning to menu.")
             else:
-                print("OTP mismatch. Returning to menu.")
-        else:
-            print("Failed to send OTP. Returning to menu.")
-
-    conn.close()
+                print("Failed to send OTP. Returning to menu.")
 
 
 def modify_supplier_details(current_user):
@@ -312,116 +279,113 @@ def modify_supplier_details(current_user):
     2) modify supplier details or delete supplier.
     - Both operations require an OTP for confirmation.
     """
-    conn = create_connection()
-    cursor = conn.cursor()
-
-    user_id, username, email, _ = current_user
-
-    # Show all suppliers
-    cursor.execute("""
-        SELECT supplier_id, supplier_name 
-        FROM suppliers
-        WHERE owner_user_id = ?
-    """, (user_id,))
-    suppliers = cursor.fetchall()
-
-    if not suppliers:
-        print("\nNo suppliers added yet.\n")
-        conn.close()
-        return
-
-    print("\n--- Your Suppliers ---")
-    print("S.No | Supplier Name")
-    print("--------------------")
-    for i, sup in enumerate(suppliers, start=1):
-        sup_id, sup_name = sup
-        print(f"{i}. {sup_name}")
+    with get_shard_connection(current_user[0]) as conn:
+        cursor = conn.cursor()
+
+        user_id, username, email, _ = current_user
+
+        # Show all suppliers
+        cursor.execute("""
+            SELECT supplier_id, supplier_name 
+            FROM suppliers
+            WHERE owner_user_id = ? AND deleted_at IS NULL
+        """, (user_id,))
+        suppliers = cursor.fetchall()
+
+        if not suppliers:
+            print("\nNo suppliers added yet.\n")
+            return
+
+        print("\n--- Your Suppliers ---")
+        print("S.No | Supplier Name")
+        print("--------------------")
+        for i, sup in enumerate(suppliers, start=1):
+            sup_id, sup_name = sup
+            print(f"{i}. {sup_name}")
+
+        user_input = input("\nEnter S.No or Supplier Name to modify/delete: ").strip()
+
+        selected_supplier = None
+        if user_input.isdigit():
+            index = int(user_input) - 1
+            if 0 <= index < len(suppliers):
+                selected_supplier = suppliers[index]
+        else:
+            selected_supplier = find_supplier_by_name(user_id, suppliers, user_input)
 
-    user_input = input("\nEnter S.No or Supplier Name to modify/delete: ").strip()
+        if not selected_supplier:
+            print("Supplier not found.")
+            return
 
-    selected_supplier = None
-    if user_input.isdigit():
-        index = int(user_input) - 1
-        if 0 <= index < len(suppliers):
-            selected_supplier = suppliers[index]
-    else:
-        for sup in suppliers:
-            if sup[1].lower() == user_input.lower():
-                selected_supplier = sup
-                break
+        sup_id, sup_name = selected_supplier
+        print(f"\nSelected: {sup_name}")
 
-    if not selected_supplier:
-        print("Supplier not found.")
-        conn.close()
-        return
+        print("\nOptions:")
+        print("1. Modify Supplier")
+        print("2. Delete Supplier")
+        choice = input("Enter choice: ").strip()
 
-    sup_id, sup_name = selected_supplier
-    print(f"\nSelected: {sup_name}")
-
-    print("\nOptions:")
-    print("1. Modify Supplier")
-    print("2. Delete Supplier")
-    choice = input("Enter choice: ").strip()
-
-    if choice == '1':
-        # Modify - ask which field to modify
-        print("Which field do you want to modify?")
-        print("1. Supplier Name")
-        print("2. Office ID")
-        print("3. User ID")
-        print("4. Password")
-        print("5. URL")
-        field_choice = input("Enter choice: ").strip()
-
-        # OTP required
-        print("Sending OTP to your registered email address...")
-        otp_code = generate_otp()
-        if send_otp_via_email(email, otp_code):
-            user_otp = input("Enter the OTP sent to your email: ").strip()
-            if user_otp == otp_code:
-                new_val = input("Enter new value: ").strip()
-                field_map = {
-                    '1': 'supplier_name',
-                    '2': 'office_id',
-                    '3': 'user_id',
-                    '4': 'password',
-                    '5': 'url'
-                }
-                if field_choice in field_map:
-                    field_name = field_map[field_choice]
-                    # If password is changed, also reset the last_reset field
-                    if field_choice == '4':
-                        # Update password
-                        cursor.execute(f"UPDATE suppliers SET {field_name} = ?, last_reset = ? WHERE supplier_id = ?",
-                                       (new_val, datetime.now(), sup_id))
+        if choice == '1':
+            # Modify - ask which field to modify
+            print("Which field do you want to modify?")
+            print("1. Supplier Name")
+            print("2. Office ID")
+            print("3. User ID")
+            print("4. Password")
+            print("5. URL")
+            field_choice = input("Enter choice: ").strip()
+
+            # OTP required
+            print("Sending OTP to your registered email address...")
+            otp_code = generate_otp()
+            if send_otp_via_email(email, otp_code):
+                user_otp = input("Enter the OTP sent to your email: ").strip()
+                if user_otp == otp_code:
+                    new_val = input("Enter new value: ").strip()
+                    field_map = {
+                        '1': 'supplier_name',
+                        '2': 'office_id',
+                        '3': 'user_id',
+                        '4': 'password',
+                        '5': 'url'
+                    }
+                    if field_choice in field_map:
+                        field_name = field_map[field_choice]
+                        # If password is changed, also reset the last_reset field
+                        if field_choice == '4':
+                            # Update password
+                            cursor.execute(f"UPDATE suppliers SET {field_name} = ?, last_reset = ? WHERE supplier_id = ?",
+                                           (encrypt_password(user_id, new_val), datetime.now(), sup_id))
+                        else:
+                            cursor.execute(f"UPDATE suppliers SET {field_name} = ? WHERE supplier_id = ?",
+                                           (new_val, sup_id))
+                        bump_supplier_version(conn, user_id)
+                        conn.commit()
+                        print(f"{field_map[field_choice]} updated successfully.")
                     else:
-                        cursor.execute(f"UPDATE suppliers SET {field_name} = ? WHERE supplier_id = ?",
-                                       (new_val, sup_id))
-                    conn.commit()
-                    print(f"{field_map[field_choice]} updated successfully.")
+                        print("Invalid choice.")
                 else:
-                    print("Invalid choice.")
-            else:
-                print("OTP mismatch. No changes made.")
-        else:
-            print("Failed to send OTP. No changes made.")
-
-    elif choice == '2':
-        # Delete
-        print("Sending OTP to your registered email address...")
-        otp_code = generate_otp()
-        if send_otp_via_email(email, otp_code):
-            user_otp = input("Enter the OTP sent to your email: ").strip()
-            if user_otp == otp_code:
-                cursor.execute("DELETE FROM suppliers WHERE supplier_id = ?", (sup_id,))
-                conn.commit()
-                print("Supplier deleted successfully.")
+                    print("OTP mismatch. No changes made.")
             else:
-                print("OTP mismatch. Supplier not deleted.")
-        else:
-            print("Failed to send OTP. Supplier not deleted.")
+                print("Failed to send OTP. No changes made.")
 
-    conn.close()
+        elif choice == '2':
+            # Delete
+            print("Sending OTP to your registered email address...")
+            otp_code = generate_otp()
+            if send_otp_via_email(email, otp_code):
+                user_otp = input("Enter the OTP sent to your email: ").strip()
+                if user_otp == otp_code:
+                    # Moves it to the trash; supplier_trash.py purges it later
+                    cursor.execute("UPDATE suppliers SET deleted_at = ? WHERE supplier_id = ?",
+                                   (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), sup_id))
+                    bump_supplier_version(conn, user_id)
+                    conn.commit()
+                    print("Supplier deleted successfully.")
+                else:
+                    print("OTP mismatch. Supplier not deleted.")
+            else:
+                print("Failed to send OTP. Supplier not deleted.")
 
 
 def remove_invisible_chars(s: str) -> str:
@@ -443,72 +407,50 @@ def add_new_suppliers(current_user):
     3) Add new suppliers
        user can choose to add via 1) csv/excel or 2) manually
     """
-    conn = create_connection()
-    cursor = conn.cursor()
-    user_id, username, email, _ = current_user
+    with get_shard_connection(current_user[0]) as conn:
+        cursor = conn.cursor()
+        user_id, username, email, _ = current_user
 
-    print("\n--- Add New Suppliers ---")
-    print("1. Using CSV file")
-    print("2. Manually")
-    choice = input("Enter choice: ").strip()
+        print("\n--- Add New Suppliers ---")
+        print("1. Using CSV file")
+        print("2. Manually")
+        choice = input("Enter choice: ").strip()
 
-    if choice == '1':
-        # CSV import
-        csv_path = input("Enter the full path of the CSV file: ").strip()
+        if choice == '1':
+            # CSV import
+            csv_path = input("Enter the full path of the CSV file: ").strip()
         
-        # Clean path from hidden/unwanted Unicode characters
-        csv_path = remove_invisible_chars(csv_path)
+            # Clean path from hidden/unwanted Unicode characters
+            csv_path = remove_invisible_chars(csv_path)
 
-        try:
-            with open(csv_path, 'r', encoding='utf-8-sig') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    supplier_name = row.get("Supplier Name", "").strip()
-                    office_id = row.get("Office ID", "").strip()
-                    supplier_user_id = row.get("User ID", "").strip()
-                    password = row.get("Password", "").strip()
-                    url = row.get("URL", "").strip()
-
-                    if not supplier_name or not password:
-                        # Minimal check - must have at least name & password
-                        continue
-
-                    cursor.execute("""
-                        INSERT INTO suppliers
-                          (supplier_name, office_id, user_id, password, url, last_reset, owner_user_id) 
-                        VALUES (?, ?, ?, ?, ?, DATETIME('now'), ?)
-                    """, (supplier_name, office_id, supplier_user_id, password, url, user_id))
-                conn.commit()
-            print("Suppliers imported successfully from CSV.")
-        except Exception as e:
-            print(f"Error importing from CSV: {e}")
+            success, msg, _ = process_csv(csv_path, user_id)
+            print(msg)
 
-    elif choice == '2':
-        # Manual add
-        while True:
-            supplier_name = input("Supplier Name: ").strip()
-            office_id = input("Office ID (optional): ").strip()
-            supplier_user_id = input("User ID: ").strip()
-            password = input("Password: ").strip()
-            url = input("URL: ").strip()
-
-            if not supplier_name or not password:
-                print("Supplier name and password are required. Please try again.")
-                continue
-
-            cursor.execute("""
-                INSERT INTO suppliers
-                  (supplier_name, office_id, user_id, password, url, last_reset, owner_user_id)
-                VALUES (?, ?, ?, ?, ?, DATETIME('now'), ?)
-            """, (supplier_name, office_id, supplier_user_id, password, url, user_id))
-            conn.commit()
-            print("Supplier added successfully!")
-
-            add_more = input("Add another supplier? (y/n): ").strip().lower()
-            if add_more != 'y':
-                break
+        elif choice == '2':
+            # Manual add
+            while True:
+                supplier_name = input("Supplier Name: ").strip()
+                office_id = input("Office ID (optional): ").strip()
+                supplier_user_id = input("User ID: ").strip()
+                password = input("Password: ").strip()
+                url = input("URL: ").strip()
+
+                if not supplier_name or not password:
+                    print("Supplier name and password are required. Please try again.")
+                    continue
+
+                cursor.execute("""
+                    INSERT INTO suppliers
+                      (supplier_name, office_id, user_id, password, url, last_reset, owner_user_id)
+                    VALUES (?, ?, ?, ?, ?, DATETIME('now'), ?)
+                """, (supplier_name, office_id, supplier_user_id, encrypt_password(user_id, password), url, user_id))
+                bump_supplier_version(conn, user_id)
+                conn.commit()
+                print("Supplier added successfully!")
 
-    conn.close()
+                add_more = input("Add another supplier? (y/n): ").strip().lower()
+                if add_more != 'y':
+                    break
 
 
 def view_password_reset_reminders(current_user):
@@ -518,47 +460,37 @@ def view_password_reset_reminders(current_user):
        The password expiry date = last_reset + 30 days
        We show reminder if current_date >= (expiry_date - 7 days)
     """
-    conn = create_connection()
-    cursor = conn.cursor()
     user_id, username, email, _ = current_user
 
-    cursor.execute("""
-        SELECT supplier_name, last_reset
-        FROM suppliers
-        WHERE owner_user_id = ?
-    """, (user_id,))
-    suppliers = cursor.fetchall()
-
-    if not suppliers:
-        print("\nNo suppliers found.\n")
-        conn.close()
-        return
-
-    reminders = []
-    for sup in suppliers:
-        sup_name, last_reset = sup
-        if last_reset:
-            try:
-                last_reset_dt = parse_datetime(last_reset)
-            except ValueError:
-                # If there's a parsing error or unexpected format, skip
-                continue
-            expiry_dt = last_reset_dt + timedelta(days=30)
-            reminder_dt = expiry_dt - timedelta(days=7)
-            now = datetime.now()
-            if now >= reminder_dt and now < expiry_dt:
-                # We are within the 7 day window
-                reminders.append((sup_name, expiry_dt.strftime("%Y-%m-%d %H:%M:%S")))
-
+    reminders = get_password_reset_reminders(user_id)
     if reminders:
         print("\nSuppliers requiring password reset soon:")
         for item in reminders:
-            sup_name, exp_time = item
-            print(f"Supplier: {sup_name}, Expiry Date: {exp_time}")
+            print(f"Supplier: {item['supplier_name']}, Expiry Date: {item['next_reset']}")
     else:
         print("\nNo supplier passwords are due for reset in the next 7 days.\n")
 
-    conn.close()
+
+def export_suppliers(current_user):
+    """
+    5) Export all suppliers, passwords included, to a CSV or XLSX file
+       with the same columns as the CSV import.
+    """
+    user_id, username, email, _ = current_user
+
+    print("Sending OTP to your registered email address...")
+    otp_code = generate_otp()
+    if not send_otp_via_email(email, otp_code):
+        print("Failed to send OTP. Nothing exported.")
+        return
+    user_otp = input("Enter the OTP sent to your email: ").strip()
+    if user_otp != otp_code:
+        print("OTP mismatch. Nothing exported.")
+        return
+
+    path = input("Enter the output file path (.csv or .xlsx): ").strip()
+    success, message = export_to_file(user_id, path)
+    print(message)
 
 
 def main_menu(current_user):
@@ -568,7 +500,8 @@ def main_menu(current_user):
     2) Modify supplier details
     3) Add new suppliers
     4) View supplier password reset reminder alert
-    5) Exit (back to welcome screen)
+    5) Export suppliers
+    6) Exit (back to welcome screen)
     """
     while True:
         print("\n--- Main Menu ---")
@@ -576,7 +509,8 @@ def main_menu(current_user):
         print("2. Modify Supplier Details")
         print("3. Add New Suppliers")
         print("4. View Supplier Password Reset Reminders")
-        print("5. Exit")
+        print("5. Export Suppliers")
+        print("6. Exit")
         choice = input("Enter your choice: ").strip()
 
         if choice == '1':
@@ -588,6 +522,8 @@ def main_menu(current_user):
         elif choice == '4':
             view_password_reset_reminders(current_user)
         elif choice == '5':
+            export_suppliers(current_user)
+        elif choice == '6':
             print("Returning to Welcome Screen...")
             break
         else:
@@ -619,5 +555,6 @@ def welcome_screen():
 
 
 if __name__ == "__main__":
-    create_tables()
+    run_migrations()
+    check_master_key()
     welcome_screen()
@@ -0,0 +1,110 @@
+import math
+import os
+import threading
+import time
+
+from db_utils import get_connection, SHARED_STORE_DEFAULT
+
+# "memory" limits per process; "sqlite" shares buckets between workers
+# through the rate_limit_buckets table (the default).
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", SHARED_STORE_DEFAULT)
+# Idle buckets are pruned every this many checks
+RATE_LIMIT_PRUNE_EVERY = 1000
+
+# bucket key -> [tokens, updated_at]
+_buckets = {}
+_lock = threading.Lock()
+# limit name -> {"allowed": n, "limited": n}
+_counters = {}
+_checks = 0
+
+
+def parse_rate(rate):
+    """Parse "capacity/seconds" (e.g. "5/60") into (capacity, tokens per second)."""
+    capacity, seconds = rate.split("/")
+    return int(capacity), int(capacity) / float(seconds)
+
+
+def _take_memory(key, capacity, refill_rate, now):
+    with _lock:
+        tokens, updated_at = _buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * refill_rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        _buckets[key] = [tokens, now]
+        return allowed, tokens
+
+
+def _take_sqlite(key, capacity, refill_rate, now):
+    with get_connection() as conn:
+        # Refill and take in one statement so concurrent workers cannot both
+        # spend the last token.
+        row = conn.execute(
+            """
+            INSERT INTO rate_limit_buckets (bucket_key, tokens, updated_at) VALUES (?, ? - 1, ?)
+            ON CONFLICT (bucket_key) DO UPDATE
+            SET tokens = MIN(?, tokens + (excluded.updated_at - updated_at) * ?) - 1,
+                updated_at = excluded.updated_at
+            WHERE MIN(?, tokens + (excluded.updated_at - updated_at) * ?) >= 1
+            RETURNING tokens
+            """,
+            (key, capacity, now, capacity, refill_rate, capacity, refill_rate),
+        ).fetchone()
+        if row:
+            return True, row[0]
+        row = conn.execute(
+            "SELECT tokens, updated_at FROM rate_limit_buckets WHERE bucket_key = ?", (key,)
+        ).fetchone()
+        return False, min(capacity, row[0] + (now - row[1]) * refill_rate)
+
+
+def take(name, key, rate):
+    """
+    Spend one token from the (name, key) bucket.
+
+    Args:
+        name (str): Limit name, e.g. "login"; used for the counters.
+        key (str): What is being limited, e.g. a client IP or email.
+        rate (str): "capacity/seconds".
+
+    Returns:
+        tuple: (allowed, retry_after_seconds)
+    """
+    capacity, refill_rate = parse_rate(rate)
+    now = time.time()
+    bucket_key = f"{name}:{key}"
+    if RATE_LIMIT_STORE == "sqlite":
+        allowed, tokens = _take_sqlite(bucket_key, capacity, refill_rate, now)
+    else:
+        allowed, tokens = _take_memory(bucket_key, capacity, refill_rate, now)
+
+    global _checks
+    with _lock:
+        counter = _counters.setdefault(name, {"allowed": 0, "limited": 0})
+        counter["allowed" if allowed else "limited"] += 1
+        _checks += 1
+        prune = _checks % RATE_LIMIT_PRUNE_EVERY == 0
+    if prune:
+        prune_idle_buckets()
+
+    if allowed:
+        return True, 0
+    return False, max(1, math.ceil((1 - tokens) / refill_rate))
+
+
+def rate_limit_stats():
+    """Allowed/limited request counts per limit name for this process."""
+    with _lock:
+        return {name: dict(counter) for name, counter in _counters.items()}
+
+
+def prune_idle_buckets(max_idle_seconds=3600):
+    """Forget in-memory buckets untouched for max_idle_seconds (they would be full anyway)."""
+    cutoff = time.time() - max_idle_seconds
+    with _lock:
+        for key in [key for key, (_, updated_at) in _buckets.items() if updated_at < cutoff]:
+            del _buckets[key]
+    if RATE_LIMIT_STORE == "sqlite":
+        with get_connection() as conn:
+            conn.execute("DELETE FROM rate_limit_buckets WHERE updated_at < ?", (cutoff,))
@@ -0,0 +1,219 @@
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from itertools import groupby
+
+from db_utils import get_connection, run_migrations, shard_paths
+from otp_utils import EMAIL_USER, open_smtp_session
+from supplier_functions import PASSWORD_REMINDER_DAYS
+
+REMINDER_DIGEST_INTERVAL_SECONDS = int(os.getenv("REMINDER_DIGEST_INTERVAL_SECONDS", "3600"))
+# A worker's claim on the day's run lapses after this long without progress
+DIGEST_CLAIM_SECONDS = int(os.getenv("DIGEST_CLAIM_SECONDS", "900"))
+DIGEST_BATCH_USERS = int(os.getenv("DIGEST_BATCH_USERS", "200"))
+
+
+def iter_expiring_suppliers(now=None, batch_size=DIGEST_BATCH_USERS):
+    """
+    Yield (user_id, email, username, [(supplier_name, expires_at), ...]) for
+    every user with at least one password expiring in the reminder window.
+
+    Each supplier database (see db_utils.shard_paths) is read batch_size
+    users at a time through idx_suppliers_live_expiry. Every batch is
+    fetched in its own short read and released before anything is yielded,
+    so sending mail never holds a read transaction (which would stall WAL
+    checkpoints). Contact details come from the users table, which is
+    always in the main database.
+    """
+    now = now or datetime.now()
+    window = (now.strftime("%Y-%m-%d %H:%M:%S"),
+              (now + timedelta(days=PASSWORD_REMINDER_DAYS)).strftime("%Y-%m-%d %H:%M:%S"))
+    for db_path in shard_paths():
+        after = 0
+        while True:
+            with get_connection(db_path) as conn:
+                rows = conn.execute(
+                    """
+                    SELECT owner_user_id, supplier_name, password_expires_at
+                    FROM suppliers
+                    WHERE deleted_at IS NULL AND password_expires_at > ? AND password_expires_at <= ?
+                      AND owner_user_id IN (
+                          SELECT DISTINCT owner_user_id FROM suppliers
+                          WHERE deleted_at IS NULL AND password_expires_at > ? AND password_expires_at <= ?
+                            AND owner_user_id > ?
+                          ORDER BY owner_user_id LIMIT ?
+                      )
+                    ORDER BY owner_user_id, password_expires_at
+                    """,
+                    (*window, *window, after, batch_size),
+                ).fetchall()
+            if not rows:
+                break
+            after = rows[-1][0]
+
+            batch = [(user_id, [(row[1], row[2]) for row in group])
+                     for user_id, group in groupby(rows, key=lambda row: row[0])]
+            with get_connection() as conn:
+                contacts = {
+                    row[0]: row[1:]
+                    for row in conn.execute(
+                        f"SELECT user_id, email, username FROM users WHERE user_id IN ({', '.join('?' * len(batch))})",
+                        [user_id for user_id, _ in batch],
+                    )
+                }
+            for user_id, suppliers in batch:
+                if user_id in contacts:
+                    yield user_id, contacts[user_id][0], contacts[user_id][1], suppliers
+
+
+def build_digest_message(to_email, username, suppliers):
+    lines = [f"Hello {username},", "", "The following supplier passwords expire soon:", ""]
+    lines += [f"- {supplier_name}: expires {expires_at}" for supplier_name, expires_at in suppliers]
+    lines += ["", "Please reset them before they expire."]
+
+    msg = MIMEText("\n".join(lines), "plain")
+    msg['From'] = EMAIL_USER
+    msg['To'] = to_email
+    msg['Subject'] = f"{len(suppliers)} supplier password(s) expiring soon"
+    return msg.as_string()
+
+
+def _claim_run(run_date, force=False):
+    """
+    Take today's run for DIGEST_CLAIM_SECONDS.
+
+    Returns False if the run already completed or another worker holds an
+    unexpired claim. A run that fails or dies keeps its row open, so a
+    later scheduler tick picks it up again.
+    """
+    now = time.time()
+    with get_connection() as conn:
+        conn.execute("INSERT OR IGNORE INTO reminder_digest_runs (run_date) VALUES (?)", (run_date,))
+        cursor = conn.execute(
+            """
+            UPDATE reminder_digest_runs SET claimed_until = ?
+            WHERE run_date = ?
+              AND (? OR (completed_at IS NULL AND (claimed_until IS NULL OR claimed_until < ?)))
+            """,
+            (now + DIGEST_CLAIM_SECONDS, run_date, bool(force), now),
+        )
+        return cursor.rowcount == 1
+
+
+def _already_sent(run_date):
+    with get_connection() as conn:
+        return {row[0] for row in conn.execute(
+            "SELECT user_id FROM reminder_digest_sent WHERE run_date = ?", (run_date,)
+        )}
+
+
+def _record_sent(run_date, user_id):
+    # Also renews the claim, so a long run is not taken over mid-way
+    with get_connection() as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO reminder_digest_sent (run_date, user_id) VALUES (?, ?)", (run_date, user_id)
+        )
+        conn.execute(
+            "UPDATE reminder_digest_runs SET emails_sent = emails_sent + 1, claimed_until = ? WHERE run_date = ?",
+            (time.time() + DIGEST_CLAIM_SECONDS, run_date),
+        )
+
+
+def _finish_run(run_date, completed):
+    with get_connection() as conn:
+        if completed:
+            conn.execute(
+                "UPDATE reminder_digest_runs SET completed_at = CURRENT_TIMESTAMP, claimed_until = NULL WHERE run_date = ?",
+                (run_date,),
+            )
+            conn.execute("DELETE FROM reminder_digest_sent WHERE run_date <= ?", (run_date,))
+        else:
+            conn.execute("UPDATE reminder_digest_runs SET claimed_until = NULL WHERE run_date = ?", (run_date,))
+
+
+def send_reminder_digests(now=None, force=False):
+    """
+    Send one digest email per user with expiring supplier passwords.
+
+    Runs at most once per calendar day unless force is set. The day only
+    counts as done once every digest went out; users already mailed are
+    recorded, so a retried run (after an SMTP outage or a crash) sends only
+    the rest. All digests go out over a single SMTP session, reopened only
+    if the server drops it.
+
+    Returns:
+        int: number of digests sent.
+    """
+    now = now or datetime.now()
+    run_date = now.strftime("%Y-%m-%d")
+    if not _claim_run(run_date, force):
+        return 0
+
+    skip = set() if force else _already_sent(run_date)
+    sent = 0
+    failed = 0
+    completed = False
+    server = None
+    try:
+        for user_id, email, username, suppliers in iter_expiring_suppliers(now):
+            if user_id in skip:
+                continue
+            message = build_digest_message(email, username, suppliers)
+            for attempt in range(2):
+                try:
+                    if server is None:
+                        server = open_smtp_session()
+                    server.sendmail(EMAIL_USER, email, message)
+                    sent += 1
+                    _record_sent(run_date, user_id)
+                    break
+                except Exception as e:
+                    print(f"Error sending reminder digest to {email}: {e}")
+                    if server:
+                        server.close()
+                        server = None
+            else:
+                failed += 1
+        completed = not failed
+    finally:
+        if server:
+            try:
+                server.quit()
+            except Exception:
+                server.close()
+        _finish_run(run_date, completed)
+    return sent
+
+
+def _scheduler_loop(interval_seconds, stop_event):
+    while not stop_event.wait(interval_seconds):
+        try:
+            send_reminder_digests()
+        except Exception as e:
+            print(f"Error running reminder digests: {e}")
+
+
+def start_digest_scheduler(interval_seconds=REMINDER_DIGEST_INTERVAL_SECONDS):
+    """
+    Check for due digests every interval_seconds on a daemon thread.
+
+    Safe to start in every worker: the claim on the day's row in
+    reminder_digest_runs ensures only one of them sends at a time.
+    Returns the threading.Event that stops the loop.
+    """
+    stop_event = threading.Event()
+    thread = threading.Thread(
+        target=_scheduler_loop, args=(interval_seconds, stop_event), name="reminder-digest", daemon=True
+    )
+    thread.start()
+    return stop_event
+
+
+if __name__ == "__main__":
+    # python reminder_digest.py [--force]
+    run_migrations()
+    count = send_reminder_digests(force="--force" in sys.argv[1:])
+    print(f"Sent {count} reminder digest(s).")
@@ -0,0 +1,205 @@
+import hashlib
+import os
+import secrets
+import threading
+import time
+
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from db_utils import get_connection
+
+# Every worker (and every node) must sign cookies with the same key, or
+# sessions issued by one are rejected by the others. Set SECRET_KEY in
+# production; without it a random key is generated once into
+# SECRET_KEY_FILE and shared by all workers on this host.
+SECRET_KEY_FILE = os.getenv("SECRET_KEY_FILE", ".secret_key")
+# Old keys still accepted while rotating, comma separated
+SECRET_KEY_FALLBACKS = [key for key in os.getenv("SECRET_KEY_FALLBACKS", "").split(",") if key]
+
+# "cookie" keeps Flask's signed-cookie sessions; "sqlite" keeps session data
+# in the sessions table and only a signed session id in the cookie.
+SESSION_STORE = os.getenv("SESSION_STORE", "cookie")
+SESSION_LIFETIME_SECONDS = int(os.getenv("SESSION_LIFETIME_SECONDS", str(12 * 3600)))
+SESSION_SWEEP_SECONDS = int(os.getenv("SESSION_SWEEP_SECONDS", "300"))
+SESSION_SWEEP_BATCH = 1000
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+def load_secret_key():
+    """
+    Return the session signing key shared by every worker.
+
+    SECRET_KEY wins. Otherwise the first worker to start writes a random key
+    to SECRET_KEY_FILE (atomically, so racing workers all end up with the
+    same one) and the rest read it.
+    """
+    key = os.getenv("SECRET_KEY")
+    if key:
+        return key
+
+    if not os.path.exists(SECRET_KEY_FILE):
+        temp_path = f"{SECRET_KEY_FILE}.{os.getpid()}.tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as file:
+            file.write(secrets.token_hex(32))
+        try:
+            # link() fails if another worker got there first; theirs wins
+            os.link(temp_path, SECRET_KEY_FILE)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp_path)
+
+    with open(SECRET_KEY_FILE) as file:
+        return file.read().strip()
+
+
+# ------------------ SERVER-SIDE SESSIONS ------------------
+def _session_key(sid):
+    # Only a hash of the id is stored, so a leaked table cannot be replayed as cookies
+    return hashlib.sha256(sid.encode("ascii")).hexdigest()
+
+
+def _new_sid():
+    return secrets.token_urlsafe(32)
+
+
+def _signer(app):
+    keys = list(app.config.get("SECRET_KEY_FALLBACKS") or []) + [app.secret_key]
+    return Signer(keys, salt="passman-session-id")
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False, expires_at=None):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires_at = expires_at
+        self.was_logged_in = bool(self.get("logged_in"))
+        self.modified = False
+
+
+def open_server_session(app, cookie_value):
+    """Load the session named by a signed id cookie, or start a new one."""
+    _ensure_sweeper()
+    if cookie_value:
+        try:
+            sid = _signer(app).unsign(cookie_value).decode("ascii")
+        except BadSignature:
+            sid = None
+        if sid:
+            with get_connection() as conn:
+                row = conn.execute(
+                    "SELECT data, expires_at FROM sessions WHERE session_key = ? AND expires_at > ?",
+                    (_session_key(sid), time.time()),
+                ).fetchone()
+            if row:
+                return ServerSideSession(session_json_serializer.loads(row[0]), sid, expires_at=row[1])
+    return ServerSideSession(sid=_new_sid(), new=True)
+
+
+def save_server_session(app, session):
+    """
+    Persist a session at the end of a request.
+
+    Rows are only rewritten when the session changed or is past half its
+    lifetime, so most requests cost no write. Returns ("set", cookie_value),
+    ("delete", None) or None when the cookie can stay as it is.
+    """
+    if not session:
+        if session.modified and not session.new:
+            with get_connection() as conn:
+                conn.execute("DELETE FROM sessions WHERE session_key = ?", (_session_key(session.sid),))
+            return "delete", None
+        return None
+
+    now = time.time()
+    refresh = session.expires_at is None or session.expires_at - now < SESSION_LIFETIME_SECONDS / 2
+    if not (session.modified or refresh):
+        return None
+
+    with get_connection() as conn:
+        if bool(session.get("logged_in")) != session.was_logged_in and not session.new:
+            # New id on login and logout, so an id planted or seen earlier is worthless
+            conn.execute("DELETE FROM sessions WHERE session_key = ?", (_session_key(session.sid),))
+            session.sid = _new_sid()
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (session_key, data, expires_at) VALUES (?, ?, ?)",
+            (_session_key(session.sid), session_json_serializer.dumps(dict(session)), now + SESSION_LIFETIME_SECONDS),
+        )
+    return "set", _signer(app).sign(session.sid).decode("ascii")
+
+
+def write_session_cookie(interface, app, session, response, action):
+    """Apply a save_server_session() result to the response cookie."""
+    if action is None:
+        return
+    name = interface.get_cookie_name(app)
+    domain = interface.get_cookie_domain(app)
+    path = interface.get_cookie_path(app)
+    if action[0] == "delete":
+        response.delete_cookie(name, domain=domain, path=path)
+        return
+    response.set_cookie(
+        name,
+        action[1],
+        expires=interface.get_expiration_time(app, session),
+        httponly=interface.get_cookie_httponly(app),
+        domain=domain,
+        path=path,
+        secure=interface.get_cookie_secure(app),
+        samesite=interface.get_cookie_samesite(app),
+    )
+    response.vary.add("Cookie")
+
+
+class SqliteSessionInterface(SessionInterface):
+    """Flask session interface backed by the sessions table (SESSION_STORE=sqlite)."""
+
+    def open_session(self, app, request):
+        return open_server_session(app, request.cookies.get(self.get_cookie_name(app)))
+
+    def save_session(self, app, session, response):
+        write_session_cookie(self, app, session, response, save_server_session(app, session))
+
+
+def evict_expired_sessions():
+    """Delete expired sessions in batches; returns how many were removed."""
+    removed = 0
+    while True:
+        with get_connection() as conn:
+            count = conn.execute(
+                """
+                DELETE FROM sessions WHERE session_key IN (
+                    SELECT session_key FROM sessions WHERE expires_at <= ? LIMIT ?
+                )
+                """,
+                (time.time(), SESSION_SWEEP_BATCH),
+            ).rowcount
+        removed += count
+        if count < SESSION_SWEEP_BATCH:
+            return removed
+
+
+def _sweep_loop():
+    while True:
+        time.sleep(SESSION_SWEEP_SECONDS)
+        try:
+            evict_expired_sessions()
+        except Exception as e:
+            print(f"Error evicting expired sessions: {e}")
+
+
+def _ensure_sweeper():
+    global _sweeper
+    with _sweeper_lock:
+        if _sweeper is None or not _sweeper.is_alive():
+            _sweeper = threading.Thread(target=_sweep_loop, name="session-sweeper", daemon=True)
+            _sweeper.start()
@@ -0,0 +1,147 @@
+"""
+Split an existing single-file database into per-tenant shards.
+
+    SHARD_MODE=owner python shard_tool.py split [--purge-source]
+    SHARD_MODE=hash SHARD_COUNT=16 python shard_tool.py split
+    SHARD_MODE=owner python shard_tool.py status
+
+Stop the app first. Every owner's suppliers (trashed ones included) are
+copied from DB_PATH into the shard db_utils.shard_file() routes them to,
+keeping their supplier ids, and the copy is checked before anything is
+removed. Re-running is safe: rows already in a shard are skipped. With
+--purge-source the copied rows are then deleted from DB_PATH; without it
+they stay there, unused while SHARD_MODE is on.
+
+Splitting is one-way. Turning SHARD_MODE back off brings back DB_PATH as it
+was at split time: everything written while sharded is missing or stale
+there, and there is no merge command. Keep a backup of DB_PATH.
+
+Supplier ids stop being globally unique once sharded rows are written:
+each shard numbers new rows on its own, so owners in different shards can
+get the same id. Always look suppliers up by (owner, id). In hash mode
+SHARD_COUNT decides which file each owner lives in and must not change once
+data has been split.
+"""
+import os
+import sys
+from collections import defaultdict
+
+import db_utils
+from db_utils import create_connection, get_connection, run_migrations, shard_for, shard_paths
+from supplier_trash import reclaim_free_pages
+
+# Columns copied as-is; password_expires_at is generated in every file
+SUPPLIER_COLUMNS = (
+    "supplier_id, supplier_name, office_id, user_id, password, url, "
+    "date_created, last_reset, owner_user_id, deleted_at"
+)
+
+
+def _copy_owner(conn, owner_user_id):
+    """Copy one owner's rows from the attached source database; returns rows inserted."""
+    inserted = conn.execute(
+        f"""
+        INSERT OR IGNORE INTO main.suppliers ({SUPPLIER_COLUMNS})
+        SELECT {SUPPLIER_COLUMNS} FROM source.suppliers WHERE owner_user_id = ?
+        """,
+        (owner_user_id,),
+    ).rowcount
+    # Start past the source's version so no cached listing survives the move
+    conn.execute(
+        """
+        INSERT INTO main.supplier_cache_versions (owner_user_id, version)
+        SELECT owner_user_id, version + 1 FROM source.supplier_cache_versions WHERE owner_user_id = ?
+        ON CONFLICT (owner_user_id) DO UPDATE SET version = MAX(version, excluded.version)
+        """,
+        (owner_user_id,),
+    )
+    missing = conn.execute(
+        """
+        SELECT COUNT(*) FROM source.suppliers s
+        WHERE s.owner_user_id = ? AND NOT EXISTS (
+            SELECT 1 FROM main.suppliers t
+            WHERE t.supplier_id = s.supplier_id AND t.owner_user_id = s.owner_user_id
+        )
+        """,
+        (owner_user_id,),
+    ).fetchone()[0]
+    if missing:
+        # A shard row already uses one of these ids for another owner
+        raise RuntimeError(f"{missing} supplier(s) of user {owner_user_id} could not be copied (id collision).")
+    return inserted
+
+
+def split_database(purge_source=False):
+    """
+    Copy every owner's suppliers from DB_PATH into their shard.
+
+    Each shard is filled on its own connection with DB_PATH attached, one
+    transaction per owner, and its search index is rebuilt once at the end.
+
+    Returns:
+        dict: owners, shards, copied (rows inserted) and purged (rows removed from DB_PATH).
+    """
+    if db_utils.SHARD_MODE not in ("owner", "hash"):
+        raise RuntimeError("Set SHARD_MODE=owner or SHARD_MODE=hash before splitting.")
+
+    run_migrations()
+    with get_connection() as conn:
+        owners = [row[0] for row in conn.execute("SELECT DISTINCT owner_user_id FROM suppliers ORDER BY 1")]
+
+    by_shard = defaultdict(list)
+    for owner_user_id in owners:
+        by_shard[shard_for(owner_user_id)].append(owner_user_id)
+
+    stats = {"owners": len(owners), "shards": len(by_shard), "copied": 0, "purged": 0}
+    for shard_path, shard_owners in sorted(by_shard.items()):
+        conn = create_connection(shard_path)
+        if conn is None:
+            raise RuntimeError(f"Could not open shard {shard_path}.")
+        try:
+            conn.execute("ATTACH DATABASE ? AS source", (os.path.abspath(db_utils.DB_PATH),))
+            for owner_user_id in shard_owners:
+                with conn:
+                    stats["copied"] += _copy_owner(conn, owner_user_id)
+            with conn:
+                conn.execute("INSERT INTO suppliers_fts (suppliers_fts) VALUES ('rebuild')")
+            conn.execute("DETACH DATABASE source")
+        finally:
+            conn.close()
+        print(f"{shard_path}: {len(shard_owners)} owner(s)")
+
+    if purge_source:
+        for owner_user_id in owners:
+            with get_connection() as conn:
+                stats["purged"] += conn.execute(
+                    "DELETE FROM suppliers WHERE owner_user_id = ?", (owner_user_id,)
+                ).rowcount
+                conn.execute("DELETE FROM supplier_cache_versions WHERE owner_user_id = ?", (owner_user_id,))
+        reclaim_free_pages()
+    return stats
+
+
+def shard_status():
+    """Yield (path, owners, live suppliers, size in bytes) for every shard."""
+    for shard_path in shard_paths():
+        with get_connection(shard_path) as conn:
+            owners, suppliers = conn.execute(
+                "SELECT COUNT(DISTINCT owner_user_id), COUNT(*) FROM suppliers WHERE deleted_at IS NULL"
+            ).fetchone()
+        yield shard_path, owners, suppliers, os.path.getsize(shard_path)
+
+
+if __name__ == "__main__":
+    # python shard_tool.py split [--purge-source] | status
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "split":
+        result = split_database(purge_source="--purge-source" in sys.argv[2:])
+        print(
+            f"Copied {result['copied']} supplier(s) of {result['owners']} owner(s) into "
+            f"{result['shards']} shard(s); removed {result['purged']} from {db_utils.DB_PATH}."
+        )
+    elif command == "status":
+        for path, owners, suppliers, size in shard_status():
+            print(f"{path}: {owners} owner(s), {suppliers} supplier(s), {size / 1024:.0f} KiB")
+    else:
+        print("Usage: python shard_tool.py split [--purge-source] | status")
+        sys.exit(2)
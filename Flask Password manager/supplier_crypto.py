@@ -0,0 +1,175 @@
+import base64
+import importlib.util
+import os
+import secrets
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 32-byte master key, base64 encoded. Generate one with:
+#   python -c "import base64, os; print(base64.b64encode(os.urandom(32)).decode())"
+# Without it supplier passwords are stored in clear text, as before.
+# Checked once at startup by check_master_key().
+SUPPLIER_MASTER_KEY = os.getenv("SUPPLIER_MASTER_KEY")
+
+CIPHERTEXT_PREFIX = "v1:"
+NONCE_BYTES = 12
+USER_KEY_CACHE_SIZE = int(os.getenv("USER_KEY_CACHE_SIZE", "1024"))
+
+
+def check_master_key():
+    """
+    Validate SUPPLIER_MASTER_KEY before serving anything.
+
+    Raises RuntimeError if the key is not 32 bytes of base64, if the
+    cryptography package is missing, or if no key is set while encrypted
+    passwords exist (they could be neither revealed nor exported).
+    """
+    if SUPPLIER_MASTER_KEY:
+        try:
+            key = base64.b64decode(SUPPLIER_MASTER_KEY, validate=True)
+        except ValueError:
+            key = b""
+        if len(key) != 32:
+            raise RuntimeError("SUPPLIER_MASTER_KEY must be 32 random bytes, base64 encoded.")
+        if importlib.util.find_spec("cryptography") is None:
+            raise RuntimeError("SUPPLIER_MASTER_KEY requires the cryptography package (pip install cryptography).")
+        return
+
+    from db_utils import get_connection, shard_paths
+
+    for db_path in shard_paths():
+        with get_connection(db_path) as conn:
+            encrypted = conn.execute(
+                "SELECT 1 FROM suppliers WHERE substr(password, 1, ?) = ? LIMIT 1",
+                (len(CIPHERTEXT_PREFIX), CIPHERTEXT_PREFIX),
+            ).fetchone()
+        if encrypted:
+            raise RuntimeError(f"{db_path} holds encrypted supplier passwords but SUPPLIER_MASTER_KEY is not set.")
+    print("Warning: SUPPLIER_MASTER_KEY is not set; supplier passwords are stored unencrypted.")
+
+
+@lru_cache(maxsize=USER_KEY_CACHE_SIZE)
+def _user_cipher(owner_user_id):
+    """
+    AES-256-GCM cipher keyed for one user.
+
+    Each user's data key is derived from the master key with HKDF, so no
+    per-user key material is stored. Derivation happens once per user per
+    process; later calls hit the cache.
+    """
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+    key = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=f"passman-supplier-password:{owner_user_id}".encode("ascii"),
+    ).derive(base64.b64decode(SUPPLIER_MASTER_KEY))
+    return AESGCM(key)
+
+
+def _aad(owner_user_id):
+    # Binds each ciphertext to its owner so rows cannot be swapped between users
+    return str(owner_user_id).encode("ascii")
+
+
+def is_encrypted(stored):
+    return stored.startswith(CIPHERTEXT_PREFIX)
+
+
+def encrypt_passwords(owner_user_id, passwords):
+    """
+    Encrypt a batch of plain-text passwords for one user.
+
+    The user's cipher is looked up once for the whole batch, which keeps
+    bulk imports close to the plain-text insert rate.
+    """
+    if not SUPPLIER_MASTER_KEY:
+        return list(passwords)
+    encrypt = _user_cipher(owner_user_id).encrypt
+    aad = _aad(owner_user_id)
+    token_bytes = secrets.token_bytes
+    b64encode = base64.b64encode
+    out = []
+    for password in passwords:
+        nonce = token_bytes(NONCE_BYTES)
+        out.append(CIPHERTEXT_PREFIX + b64encode(nonce + encrypt(nonce, password.encode("utf-8"), aad)).decode("ascii"))
+    return out
+
+
+def encrypt_password(owner_user_id, password):
+    return encrypt_passwords(owner_user_id, [password])[0]
+
+
+def decrypt_password(owner_user_id, stored):
+    """
+    Return the plain-text password for a stored value.
+
+    Values written before encryption was enabled are returned unchanged.
+    Raises ValueError if the value cannot be decrypted: no key or the wrong
+    key is configured, or the ciphertext was altered.
+    """
+    if stored is None or not is_encrypted(stored):
+        return stored
+    if not SUPPLIER_MASTER_KEY:
+        raise ValueError("Supplier password is encrypted but SUPPLIER_MASTER_KEY is not set.")
+    from cryptography.exceptions import InvalidTag
+
+    try:
+        raw = base64.b64decode(stored[len(CIPHERTEXT_PREFIX):], validate=True)
+        plaintext = _user_cipher(owner_user_id).decrypt(raw[:NONCE_BYTES], raw[NONCE_BYTES:], _aad(owner_user_id))
+    except (InvalidTag, ValueError) as e:
+        raise ValueError("Supplier password could not be decrypted (wrong SUPPLIER_MASTER_KEY or altered data).") from e
+    return plaintext.decode("utf-8")
+
+
+def encrypt_existing_passwords(batch_size=1000):
+    """
+    Encrypt every supplier password still stored in clear text.
+
+    Works in batches of batch_size rows, one transaction each, so it can run
+    against a live database. Returns the number of rows encrypted.
+    """
+    from db_utils import get_connection, shard_paths
+
+    if not SUPPLIER_MASTER_KEY:
+        raise RuntimeError("SUPPLIER_MASTER_KEY must be set to encrypt existing passwords.")
+
+    total = 0
+    for db_path in shard_paths():
+        last_id = 0
+        while True:
+            with get_connection(db_path) as conn:
+                rows = conn.execute(
+                    """
+                    SELECT supplier_id, owner_user_id, password FROM suppliers
+                    WHERE supplier_id > ? ORDER BY supplier_id LIMIT ?
+                    """,
+                    (last_id, batch_size),
+                ).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+
+                updates = [
+                    (encrypt_password(owner_user_id, password), supplier_id)
+                    for supplier_id, owner_user_id, password in rows
+                    if not is_encrypted(password)
+                ]
+                conn.executemany("UPDATE suppliers SET password = ? WHERE supplier_id = ?", updates)
+                total += len(updates)
+    return total
+
+
+if __name__ == "__main__":
+    # python supplier_crypto.py  -> encrypt legacy clear-text supplier passwords
+    from db_utils import run_migrations
+
+    run_migrations()
+    check_master_key()
+    print(f"Encrypted {encrypt_existing_passwords()} supplier password(s).")
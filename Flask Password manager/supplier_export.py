@@ -0,0 +1,184 @@
+import csv
+import io
+import os
+import sys
+import tempfile
+
+from db_utils import create_connection, get_connection, run_migrations, shard_for
+from supplier_crypto import check_master_key, decrypt_password
+from supplier_functions import IMPORT_HEADERS, xlsx_supported
+
+# Exports use the import headers so an exported file can be imported again
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_CHUNK_BYTES = 64 * 1024
+XLSX_UNAVAILABLE = "XLSX export requires openpyxl (pip install openpyxl)."
+
+
+def iter_export_rows(owner_user_id, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield (Supplier Name, Office ID, User ID, Password, URL) for each of the
+    user's live suppliers, oldest first, with passwords decrypted.
+
+    Rows are pulled from one open cursor batch_size at a time, on a
+    dedicated connection so a long download never holds the thread's
+    pooled connection.
+    """
+    conn = create_connection(shard_for(owner_user_id))
+    if conn is None:
+        return
+    try:
+        cursor = conn.execute(
+            """
+            SELECT supplier_name, office_id, user_id, password, url
+            FROM suppliers
+            WHERE owner_user_id = ? AND deleted_at IS NULL
+            ORDER BY date_created, supplier_id
+            """,
+            (owner_user_id,),
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for supplier_name, office_id, user_id, password, url in rows:
+                yield supplier_name, office_id or "", user_id or "", decrypt_password(owner_user_id, password), url or ""
+    finally:
+        conn.close()
+
+
+def iter_csv(owner_user_id):
+    """Yield the user's suppliers as UTF-8 CSV, in chunks of about EXPORT_CHUNK_BYTES."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so Excel detects UTF-8; the importer reads utf-8-sig
+    buffer.write("\ufeff")
+    writer.writerow(IMPORT_HEADERS)
+    for row in iter_export_rows(owner_user_id):
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def write_xlsx(owner_user_id, fileobj):
+    """
+    Write the user's suppliers to fileobj as an XLSX workbook.
+
+    Uses openpyxl's write-only mode, which spools rows to disk instead of
+    building the sheet in memory.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Suppliers")
+    sheet.append(IMPORT_HEADERS)
+    for row in iter_export_rows(owner_user_id):
+        sheet.append(row)
+    workbook.save(fileobj)
+
+
+def iter_xlsx(owner_user_id):
+    """
+    Yield an XLSX export in EXPORT_CHUNK_BYTES chunks.
+
+    A zip file cannot be streamed before it is complete, so the workbook is
+    built in an anonymous temporary file and then read back.
+    """
+    with tempfile.TemporaryFile() as spool:
+        write_xlsx(owner_user_id, spool)
+        spool.seek(0)
+        while True:
+            chunk = spool.read(EXPORT_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+
+
+def spool_export(owner_user_id, export_format):
+    """
+    Build a complete export in an anonymous temporary file and return it, rewound.
+
+    Raises ValueError if a password cannot be decrypted. Because nothing has
+    been sent yet at that point, a download is never cut off halfway.
+    """
+    spool = tempfile.TemporaryFile()
+    try:
+        if export_format == "xlsx":
+            write_xlsx(owner_user_id, spool)
+        else:
+            for chunk in iter_csv(owner_user_id):
+                spool.write(chunk)
+        spool.seek(0)
+        return spool
+    except BaseException:
+        spool.close()
+        raise
+
+
+def iter_spool(spool):
+    """Yield a spooled export in EXPORT_CHUNK_BYTES chunks, closing it at the end."""
+    with spool:
+        while True:
+            chunk = spool.read(EXPORT_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+
+
+def iter_export(owner_user_id, export_format):
+    if export_format == "xlsx":
+        return iter_xlsx(owner_user_id)
+    return iter_csv(owner_user_id)
+
+
+def export_to_file(owner_user_id, path):
+    """
+    Export the user's suppliers to path; the format follows the extension.
+
+    Returns:
+        tuple: (success, message)
+    """
+    export_format = path.rsplit(".", 1)[-1].lower() if "." in path else ""
+    if export_format not in EXPORT_FORMATS:
+        return False, "Export file must end in .csv or .xlsx."
+    if export_format == "xlsx" and not xlsx_supported():
+        return False, XLSX_UNAVAILABLE
+    # Written beside the target and renamed at the end, so a failed export
+    # never leaves a truncated file under the requested name
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as file:
+            for chunk in iter_export(owner_user_id, export_format):
+                file.write(chunk)
+        os.replace(temp_path, path)
+        return True, f"Suppliers exported to {path}."
+    except ValueError as e:
+        return False, f"Export aborted: {e}"
+    except OSError as e:
+        return False, f"Error writing export: {e}"
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+if __name__ == "__main__":
+    # python supplier_export.py <username> <output.csv|output.xlsx>
+    if len(sys.argv) != 3:
+        print("Usage: python supplier_export.py <username> <output.csv|output.xlsx>")
+        sys.exit(2)
+    run_migrations()
+    check_master_key()
+    with get_connection() as conn:
+        row = conn.execute("SELECT user_id FROM users WHERE username = ?", (sys.argv[1],)).fetchone()
+    if not row:
+        print(f"No user named {sys.argv[1]}.")
+        sys.exit(1)
+    success, message = export_to_file(row[0], sys.argv[2])
+    print(message)
+    sys.exit(0 if success else 1)
@@ -1,50 +1,285 @@
 import sqlite3
 from datetime import datetime, timedelta
+import base64
 import csv
-import unicodedata
+import importlib.util
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from db_utils import get_shard_connection
+from supplier_crypto import encrypt_password, encrypt_passwords, decrypt_password
 
-# Database Connection
-def create_connection():
+
+# Helper Functions
+def remove_invisible_chars(s):
+    return "".join(ch for ch in s if ch.isprintable())
+
+ALLOWED_EXTENSIONS = {'csv', 'xls', 'xlsx'}
+
+# The 30-day expiry itself is computed by the suppliers.password_expires_at
+# column (see db_utils.MIGRATIONS); reminders start this many days before it.
+PASSWORD_REMINDER_DAYS = 7
+
+SUPPLIER_PAGE_SIZE = 50
+MAX_SUPPLIER_PAGE_SIZE = 500
+
+
+def encode_cursor(date_created, supplier_id):
+    """Pack a (date_created, supplier_id) sort key into an opaque URL-safe token."""
+    raw = f"{date_created}|{supplier_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor(); returns None for a missing or malformed token."""
+    if not cursor:
+        return None
     try:
-        conn = sqlite3.connect("password_manager.db")
-        conn.execute("PRAGMA foreign_keys = 1;")
-        return conn
-    except sqlite3.Error as e:
-        print(f"Error creating DB connection: {e}")
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date_created, supplier_id = base64.urlsafe_b64decode(padded).decode("utf-8").rsplit("|", 1)
+        return date_created, int(supplier_id)
+    except (ValueError, UnicodeDecodeError):
         return None
 
 
-# Helper Functions
-def parse_datetime(dt_string):
-    try:
-        return datetime.strptime(dt_string, "%Y-%m-%d %H:%M:%S.%f")
-    except ValueError:
-        return datetime.strptime(dt_string, "%Y-%m-%d %H:%M:%S")
+# Listing projection: everything a supplier table shows, never the password.
+# Passwords are loaded one at a time through get_supplier_password().
+SupplierListing = namedtuple(
+    "SupplierListing", ["id", "supplier_name", "office_id", "user_id", "url", "date_created", "last_reset"]
+)
+SUPPLIER_LISTING_COLUMNS = "supplier_id, supplier_name, office_id, user_id, url, date_created, last_reset"
 
 
-def remove_invisible_chars(s):
-    return "".join(ch for ch in s if ch.isprintable())
+def _listing_row(cursor, row):
+    return SupplierListing._make(row)
+
+
+# Listing Cache
+# Per-owner LRU of listing results. Each entry remembers the owner's row in
+# supplier_cache_versions when it was filled; a write from any process bumps
+# that version, so stale entries are detected on the next read.
+SUPPLIER_CACHE_MAX_OWNERS = int(os.getenv("SUPPLIER_CACHE_MAX_OWNERS", "256"))
+SUPPLIER_CACHE_MAX_PAGES = int(os.getenv("SUPPLIER_CACHE_MAX_PAGES", "8"))
+SUPPLIER_CACHE_TTL_SECONDS = float(os.getenv("SUPPLIER_CACHE_TTL_SECONDS", "60"))
+# Memory bound: total listing rows held, and the largest single result worth
+# caching (bigger listings are always read from the database).
+SUPPLIER_CACHE_MAX_ROWS = int(os.getenv("SUPPLIER_CACHE_MAX_ROWS", "100000"))
+SUPPLIER_CACHE_MAX_RESULT_ROWS = int(os.getenv("SUPPLIER_CACHE_MAX_RESULT_ROWS", "5000"))
+
+# owner_user_id -> [version, expires_at, OrderedDict of key -> (result, rows), rows]
+_supplier_cache = OrderedDict()
+_supplier_cache_lock = threading.Lock()
+_supplier_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_supplier_cache_rows = 0
+
+
+def _supplier_version(conn, owner_user_id):
+    row = conn.execute(
+        "SELECT version FROM supplier_cache_versions WHERE owner_user_id = ?", (owner_user_id,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def bump_supplier_version(conn, owner_user_id):
+    """
+    Mark an owner's suppliers as changed. Call inside the writing transaction
+    so other processes never see new rows with an old version.
+    """
+    conn.execute("""
+        INSERT INTO supplier_cache_versions (owner_user_id, version) VALUES (?, 1)
+        ON CONFLICT (owner_user_id) DO UPDATE SET version = version + 1
+    """, (owner_user_id,))
+
+
+def invalidate_supplier_cache(owner_user_id):
+    """Drop this process's cached listings for the owner."""
+    with _supplier_cache_lock:
+        if _drop_cached_owner(owner_user_id) is not None:
+            _supplier_cache_stats["invalidations"] += 1
+
+
+def supplier_cache_stats():
+    with _supplier_cache_lock:
+        return dict(_supplier_cache_stats, owners=len(_supplier_cache), rows=_supplier_cache_rows)
+
+
+def _drop_cached_owner(owner_user_id):
+    # Caller holds _supplier_cache_lock
+    global _supplier_cache_rows
+    entry = _supplier_cache.pop(owner_user_id, None)
+    if entry is not None:
+        _supplier_cache_rows -= entry[3]
+    return entry
+
+
+def _cached_listing(conn, owner_user_id, key, loader, size=len):
+    """Return loader()'s result through the cache; size(result) counts its rows."""
+    global _supplier_cache_rows
+    version = _supplier_version(conn, owner_user_id)
+    now = time.monotonic()
+    with _supplier_cache_lock:
+        entry = _supplier_cache.get(owner_user_id)
+        if entry and entry[0] == version and entry[1] > now and key in entry[2]:
+            _supplier_cache.move_to_end(owner_user_id)
+            entry[2].move_to_end(key)
+            _supplier_cache_stats["hits"] += 1
+            return entry[2][key][0]
+        _supplier_cache_stats["misses"] += 1
+
+    value = loader()
+    rows = size(value)
+    if rows > SUPPLIER_CACHE_MAX_RESULT_ROWS:
+        return value
+
+    with _supplier_cache_lock:
+        entry = _supplier_cache.get(owner_user_id)
+        if not entry or entry[0] != version or entry[1] <= now:
+            _drop_cached_owner(owner_user_id)
+            entry = [version, now + SUPPLIER_CACHE_TTL_SECONDS, OrderedDict(), 0]
+            _supplier_cache[owner_user_id] = entry
+        previous = entry[2].pop(key, None)
+        entry[2][key] = (value, rows)
+        entry[3] += rows - (previous[1] if previous else 0)
+        _supplier_cache_rows += rows - (previous[1] if previous else 0)
+        if len(entry[2]) > SUPPLIER_CACHE_MAX_PAGES:
+            evicted_rows = entry[2].popitem(last=False)[1][1]
+            entry[3] -= evicted_rows
+            _supplier_cache_rows -= evicted_rows
+        _supplier_cache.move_to_end(owner_user_id)
+        while _supplier_cache and (
+            len(_supplier_cache) > SUPPLIER_CACHE_MAX_OWNERS or _supplier_cache_rows > SUPPLIER_CACHE_MAX_ROWS
+        ):
+            _drop_cached_owner(next(iter(_supplier_cache)))
+    return value
 
-ALLOWED_EXTENSIONS = {'csv', 'xls', 'xlsx'}
 
 # Supplier Management Functions
 def get_user_suppliers(user_id):
-    conn = create_connection()
-    if not conn:
+    with get_shard_connection(user_id) as conn:
+        if not conn:
+            return []
+
+        def load():
+            cursor = conn.cursor()
+            cursor.row_factory = _listing_row
+            cursor.execute(f"""
+                SELECT {SUPPLIER_LISTING_COLUMNS}
+                FROM suppliers
+                WHERE owner_user_id = ? AND deleted_at IS NULL
+                ORDER BY date_created DESC, supplier_id DESC
+            """, (user_id,))
+            return cursor.fetchall()
+
+        return _cached_listing(conn, user_id, "all", load)
+
+def get_user_suppliers_page(user_id, after=None, limit=SUPPLIER_PAGE_SIZE):
+    """
+    Fetch one page of a user's suppliers, newest first.
+
+    Uses keyset pagination on (date_created, supplier_id) so every page is a
+    bounded index range scan regardless of how deep the user has paged.
+
+    Returns:
+        tuple: (suppliers, next_cursor) where suppliers is a list of
+        SupplierListing and next_cursor is None on the last page.
+    """
+    limit = max(1, min(int(limit), MAX_SUPPLIER_PAGE_SIZE))
+    position = decode_cursor(after)
+
+    with get_shard_connection(user_id) as conn:
+        if not conn:
+            return [], None
+
+        def load():
+            cursor = conn.cursor()
+            cursor.row_factory = _listing_row
+            if position:
+                cursor.execute(f"""
+                    SELECT {SUPPLIER_LISTING_COLUMNS}
+                    FROM suppliers
+                    WHERE owner_user_id = ? AND deleted_at IS NULL AND (date_created, supplier_id) < (?, ?)
+                    ORDER BY date_created DESC, supplier_id DESC
+                    LIMIT ?
+                """, (user_id, position[0], position[1], limit + 1))
+            else:
+                cursor.execute(f"""
+                    SELECT {SUPPLIER_LISTING_COLUMNS}
+                    FROM suppliers
+                    WHERE owner_user_id = ? AND deleted_at IS NULL
+                    ORDER BY date_created DESC, supplier_id DESC
+                    LIMIT ?
+                """, (user_id, limit + 1))
+            rows = cursor.fetchall()
+
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(rows[-1].date_created, rows[-1].id)
+            return rows, next_cursor
+
+        return _cached_listing(conn, user_id, ("page", position, limit), load, size=lambda page: len(page[0]))
+
+SEARCH_RESULT_LIMIT = 20
+# Relative bm25 weights for supplier_name, office_id, user_id, url, owner_user_id
+SEARCH_COLUMN_WEIGHTS = (10.0, 2.0, 2.0, 1.0, 0.0)
+
+
+def _fts_query(owner_user_id, text):
+    """
+    Build an FTS5 MATCH expression that prefix-matches every word in text
+    within the owner's rows. Returns None if text has no searchable words.
+    """
+    terms = re.findall(r"\w+", text.lower())
+    if not terms:
+        return None
+    words = " AND ".join(f'"{term}"*' for term in terms)
+    return f'owner_user_id:"{int(owner_user_id)}" AND {{supplier_name office_id user_id url}}: ({words})'
+
+
+def search_suppliers(user_id, text, limit=SEARCH_RESULT_LIMIT):
+    """
+    Ranked prefix search over a user's suppliers via the suppliers_fts index.
+
+    Every word in text must prefix-match one of supplier name, office ID,
+    user ID or URL. Returns a list of SupplierListing.
+    """
+    match = _fts_query(user_id, text or "")
+    if not match:
         return []
+    limit = max(1, min(int(limit), MAX_SUPPLIER_PAGE_SIZE))
+
+    with get_shard_connection(user_id) as conn:
+        if not conn:
+            return []
+        cursor = conn.cursor()
+        cursor.row_factory = _listing_row
+        cursor.execute(f"""
+            SELECT s.supplier_id, s.supplier_name, s.office_id, s.user_id, s.url, s.date_created, s.last_reset
+            FROM suppliers_fts
+            JOIN suppliers s ON s.supplier_id = suppliers_fts.rowid
+            WHERE suppliers_fts MATCH ? AND s.deleted_at IS NULL
+            ORDER BY bm25(suppliers_fts, {", ".join(map(str, SEARCH_COLUMN_WEIGHTS))})
+            LIMIT ?
+        """, (match, limit))
+        return cursor.fetchall()
 
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT supplier_id, supplier_name, office_id, user_id, password, url, date_created, last_reset
-        FROM suppliers
-        WHERE owner_user_id = ?
-        ORDER BY date_created DESC
-    """, (user_id,))
-    suppliers = cursor.fetchall()
-    conn.close()
 
-    return [{"id": row[0], "supplier_name": row[1], "office_id": row[2], "user_id": row[3], "password": row[4],
-             "url": row[5], "date_created": row[6], "last_reset": row[7]} for row in suppliers]
+def get_supplier_password(owner_user_id, supplier_id):
+    """
+    Load a single supplier password for reveal; None if not found or not owned.
+
+    Raises ValueError if the stored password cannot be decrypted.
+    """
+    with get_shard_connection(owner_user_id) as conn:
+        if not conn:
+            return None
+        row = conn.execute(
+            "SELECT password FROM suppliers WHERE supplier_id = ? AND owner_user_id = ? AND deleted_at IS NULL",
+            (supplier_id, owner_user_id),
+        ).fetchone()
+    return decrypt_password(owner_user_id, row[0]) if row else None
 
 def allowed_file(filename):
     """Check if the uploaded file has an allowed extension."""
@@ -55,17 +290,17 @@ def add_supplier(owner_user_id, supplier_name, office_id, user_id, password, url
         return False, "Supplier name and password are required."
 
     try:
-        conn = create_connection()
-        cursor = conn.cursor()
+        with get_shard_connection(owner_user_id) as conn:
+            cursor = conn.cursor()
 
-        # Insert the supplier into the database
-        cursor.execute("""
-            INSERT INTO suppliers (supplier_name, office_id, user_id, password, url, owner_user_id)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (supplier_name, office_id, user_id, password, url, owner_user_id))
+            # Insert the supplier into the database
+            cursor.execute("""
+                INSERT INTO suppliers (supplier_name, office_id, user_id, password, url, owner_user_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (supplier_name, office_id, user_id, encrypt_password(owner_user_id, password), url, owner_user_id))
+            bump_supplier_version(conn, owner_user_id)
 
-        conn.commit()
-        conn.close()
+        invalidate_supplier_cache(owner_user_id)
         return True, "Supplier added successfully."
     except sqlite3.IntegrityError as e:
         return False, f"Database error: {str(e)}"
@@ -73,26 +308,165 @@ def add_supplier(owner_user_id, supplier_name, office_id, user_id, password, url
         return False, f"An unexpected error occurred: {str(e)}"
 
 
-def modify_supplier(supplier_id, field_name, new_value):
+# Columns a user may change on an existing supplier
+MODIFIABLE_FIELDS = ("supplier_name", "office_id", "user_id", "password", "url")
+MAX_SUPPLIER_CHANGES = 500
+
+
+def _validate_change(change):
+    """Return an error message for a malformed change, or None."""
+    if not isinstance(change, dict):
+        return "Each change must be an object."
+    if change.get("op") not in ("update", "delete", "restore"):
+        return "op must be 'update', 'delete' or 'restore'."
+    if not isinstance(change.get("id"), int) or isinstance(change.get("id"), bool):
+        return "id must be an integer supplier ID."
+    if change["op"] == "update":
+        fields = change.get("fields")
+        if not isinstance(fields, dict) or not fields:
+            return "fields must be a non-empty object."
+        unknown = [name for name in fields if name not in MODIFIABLE_FIELDS]
+        if unknown:
+            return f"Fields cannot be modified: {', '.join(sorted(map(str, unknown)))}."
+        if not all(isinstance(value, str) for value in fields.values()):
+            return "Field values must be strings."
+        if fields.get("supplier_name", "x").strip() == "" or fields.get("password", "x") == "":
+            return "Supplier name and password cannot be empty."
+    return None
+
+
+class _ChangeBatchFailed(Exception):
+    pass
+
+
+def apply_supplier_changes(owner_user_id, changes):
     """
-    Modify a specific field of a supplier.
+    Apply a batch of supplier updates and deletes in a single transaction.
+
+    Each change is {"op": "update", "id": <supplier_id>, "fields": {column: value}},
+    {"op": "delete", "id": <supplier_id>} or {"op": "restore", "id": <supplier_id>};
+    only MODIFIABLE_FIELDS may be set, and only suppliers owned by
+    owner_user_id are touched. Deletes move suppliers to the trash (see
+    delete_supplier). Changing the password encrypts it and restarts its
+    30-day expiry.
+
+    The batch is all-or-nothing: if any change is invalid or matches no
+    supplier, nothing is written.
+
+    Returns:
+        tuple: (success, results) with one {"index", "id", "ok", "error"} dict per change.
     """
-    conn = create_connection()
+    if not isinstance(changes, list) or not changes:
+        return False, [{"index": None, "id": None, "ok": False, "error": "changes must be a non-empty list."}]
+    if len(changes) > MAX_SUPPLIER_CHANGES:
+        return False, [{"index": None, "id": None, "ok": False,
+                        "error": f"At most {MAX_SUPPLIER_CHANGES} changes per request."}]
+
+    results = []
+    for index, change in enumerate(changes):
+        error = _validate_change(change)
+        results.append({
+            "index": index,
+            "id": change.get("id") if isinstance(change, dict) else None,
+            "ok": error is None,
+            "error": error,
+        })
+    if not all(result["ok"] for result in results):
+        for result in results:
+            if result["ok"]:
+                result.update(ok=False, error="Not applied.")
+        return False, results
+
+    # Encrypt every new password up front, with one cipher lookup for the batch
+    passwords = iter(encrypt_passwords(
+        owner_user_id,
+        [change["fields"]["password"] for change in changes
+         if change["op"] == "update" and "password" in change["fields"]],
+    ))
+
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    failed = False
     try:
-        cursor = conn.cursor()
-        query = f"UPDATE suppliers SET {field_name} = ? WHERE supplier_id = ?"
-        cursor.execute(query, (new_value, supplier_id))
-        conn.commit()
+        with get_shard_connection(owner_user_id) as conn:
+            cursor = conn.cursor()
+            for change, result in zip(changes, results):
+                if change["op"] == "delete":
+                    cursor.execute(
+                        """
+                        UPDATE suppliers SET deleted_at = ?
+                        WHERE supplier_id = ? AND owner_user_id = ? AND deleted_at IS NULL
+                        """,
+                        (now, change["id"], owner_user_id),
+                    )
+                elif change["op"] == "restore":
+                    cursor.execute(
+                        """
+                        UPDATE suppliers SET deleted_at = NULL
+                        WHERE supplier_id = ? AND owner_user_id = ? AND deleted_at IS NOT NULL
+                        """,
+                        (change["id"], owner_user_id),
+                    )
+                else:
+                    fields = dict(change["fields"])
+                    if "password" in fields:
+                        fields["password"] = next(passwords)
+                        # Same as the CLI: a new password restarts its expiry
+                        fields["last_reset"] = now
+                    if "supplier_name" in fields:
+                        fields["supplier_name"] = remove_invisible_chars(fields["supplier_name"].strip())
+                    # Column names come from MODIFIABLE_FIELDS (plus last_reset) only
+                    assignments = ", ".join(f"{name} = ?" for name in fields)
+                    cursor.execute(
+                        f"""
+                        UPDATE suppliers SET {assignments}
+                        WHERE supplier_id = ? AND owner_user_id = ? AND deleted_at IS NULL
+                        """,
+                        (*fields.values(), change["id"], owner_user_id),
+                    )
+                if cursor.rowcount == 0:
+                    result.update(ok=False, error="Supplier not found.")
+                    failed = True
+
+            if failed:
+                # Leaving the block with an exception rolls the whole batch back
+                raise _ChangeBatchFailed()
+            bump_supplier_version(conn, owner_user_id)
+    except _ChangeBatchFailed:
+        for result in results:
+            if result["ok"]:
+                result.update(ok=False, error="Not applied.")
+        return False, results
+    except sqlite3.Error as e:
+        for result in results:
+            result.update(ok=False, error=f"Database error: {e}")
+        return False, results
+
+    invalidate_supplier_cache(owner_user_id)
+    return True, results
+
+
+def modify_supplier(owner_user_id, supplier_id, field_name, new_value):
+    """
+    Modify a specific field of one of the user's suppliers.
+    """
+    try:
+        supplier_id = int(supplier_id)
+    except (TypeError, ValueError):
+        return False, "Invalid supplier ID."
+    success, results = apply_supplier_changes(
+        owner_user_id, [{"op": "update", "id": supplier_id, "fields": {field_name: new_value}}]
+    )
+    if success:
         return True, "Supplier updated successfully."
-    except Exception as e:
-        return False, f"Error updating supplier: {e}"
-    finally:
-        conn.close()
+    return False, f"Error updating supplier: {results[0]['error']}"
 
 # In supplier_functions.py
 def delete_supplier(user_id, supplier_ids):
     """
-    Deletes suppliers for the given user and supplier IDs.
+    Moves suppliers for the given user and supplier IDs to the trash.
+
+    Trashed suppliers disappear from every listing straight away and can be
+    brought back with restore_suppliers until supplier_trash.py purges them.
 
     Args:
         user_id (int): The ID of the user who owns the suppliers.
@@ -101,94 +475,274 @@ def delete_supplier(user_id, supplier_ids):
     Returns:
         tuple: (success, message)
     """
-    conn = create_connection()
-    if not conn:
-        return False, "Database connection error."
+    return _set_deleted(user_id, supplier_ids, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+
+def restore_suppliers(user_id, supplier_ids):
+    """
+    Takes suppliers back out of the trash.
+
+    Returns:
+        tuple: (success, message)
+    """
+    return _set_deleted(user_id, supplier_ids, None)
+
 
+def _set_deleted(user_id, supplier_ids, deleted_at):
+    action = "deleted" if deleted_at else "restored"
     try:
-        cursor = conn.cursor()
-        # Ensure supplier IDs belong to the logged-in user
-        cursor.executemany(
-            "DELETE FROM suppliers WHERE supplier_id = ? AND owner_user_id = ?",
-            [(supplier_id, user_id) for supplier_id in supplier_ids],
-        )
-        conn.commit()
-        return True, f"{len(supplier_ids)} supplier(s) deleted successfully."
+        with get_shard_connection(user_id) as conn:
+            if not conn:
+                return False, "Database connection error."
+
+            cursor = conn.cursor()
+            # Ensure supplier IDs belong to the logged-in user; rows already in
+            # the requested state are not counted.
+            cursor.executemany(
+                f"""
+                UPDATE suppliers SET deleted_at = ?
+                WHERE supplier_id = ? AND owner_user_id = ? AND deleted_at IS {"NULL" if deleted_at else "NOT NULL"}
+                """,
+                [(deleted_at, supplier_id, user_id) for supplier_id in supplier_ids],
+            )
+            changed = cursor.rowcount
+            if changed:
+                bump_supplier_version(conn, user_id)
+
+        if changed:
+            invalidate_supplier_cache(user_id)
+        return True, f"{changed} supplier(s) {action} successfully."
     except sqlite3.Error as e:
-        return False, f"Error deleting supplier(s): {str(e)}"
-    finally:
-        conn.close()
+        return False, f"Error {'deleting' if deleted_at else 'restoring'} supplier(s): {str(e)}"
 
 
 def view_password_reset_reminders(user_id):
     """
     Show suppliers with passwords expiring within the next 7 days.
+
+    Returns a list of dicts with supplier_name, last_reset and next_reset,
+    soonest expiry first.
     """
-    conn = create_connection()
+    now = datetime.now()
+    window_end = now + timedelta(days=PASSWORD_REMINDER_DAYS)
     try:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT supplier_name, last_reset
-            FROM suppliers WHERE owner_user_id = ?
-            """,
-            (user_id,),
-        )
-        suppliers = cursor.fetchall()
-
-        reminders = []
-        now = datetime.now()
-        for sup_name, last_reset in suppliers:
-            if last_reset:
-                try:
-                    last_reset_dt = parse_datetime(last_reset)
-                    expiry_dt = last_reset_dt + timedelta(days=30)
-                    reminder_dt = expiry_dt - timedelta(days=7)
-                    if now >= reminder_dt and now < expiry_dt:
-                        reminders.append((sup_name, expiry_dt.strftime("%Y-%m-%d %H:%M:%S")))
-                except ValueError:
-                    continue
-
-        return reminders
+        with get_shard_connection(user_id) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT supplier_name, last_reset, password_expires_at
+                FROM suppliers
+                WHERE owner_user_id = ? AND deleted_at IS NULL
+                  AND password_expires_at > ? AND password_expires_at <= ?
+                ORDER BY password_expires_at
+                """,
+                (user_id, now.strftime("%Y-%m-%d %H:%M:%S"), window_end.strftime("%Y-%m-%d %H:%M:%S")),
+            )
+            return [
+                {"supplier_name": sup_name, "last_reset": last_reset, "next_reset": expires_at}
+                for sup_name, last_reset, expires_at in cursor.fetchall()
+            ]
     except Exception as e:
         print(f"Error fetching password reset reminders: {e}")
         return []
-    finally:
-        conn.close()
 
 
-def import_suppliers_from_csv(user_id, csv_path):
+# Bulk Import
+IMPORT_HEADERS = ("Supplier Name", "Office ID", "User ID", "Password", "URL")
+IMPORT_CHUNK_SIZE = 1000
+MAX_IMPORT_ERRORS = 100
+XLSX_IMPORT_UNAVAILABLE = "XLSX import requires openpyxl (pip install openpyxl)."
+
+
+def _import_chunks(owner_user_id, rows, stats, chunk_size):
     """
-    Import suppliers from a CSV file for the user.
+    Validate header-keyed rows and group the accepted ones into insert chunks.
+
+    Rejected rows are counted in stats and their first MAX_IMPORT_ERRORS
+    reasons kept as (row_number, message) pairs.
     """
-    conn = create_connection()
-    try:
+    chunk = []
+    for row_number, row in enumerate(rows, start=2):  # row 1 is the header
+        supplier_name = (row.get("Supplier Name") or "").strip()
+        office_id = (row.get("Office ID") or "").strip()
+        user_id_val = (row.get("User ID") or "").strip()
+        password = (row.get("Password") or "").strip()
+        url = (row.get("URL") or "").strip()
+
+        if not supplier_name or not password:
+            stats["rejected"] += 1
+            if len(stats["errors"]) < MAX_IMPORT_ERRORS:
+                stats["errors"].append((row_number, "Supplier name and password are required."))
+            continue
+
+        chunk.append((supplier_name, office_id, user_id_val, password, url, owner_user_id))
+        if len(chunk) >= chunk_size:
+            yield _encrypt_chunk(owner_user_id, chunk)
+            chunk = []
+    if chunk:
+        yield _encrypt_chunk(owner_user_id, chunk)
+
+
+def _encrypt_chunk(owner_user_id, chunk):
+    # One batched encryption call per chunk rather than one per row
+    ciphertexts = encrypt_passwords(owner_user_id, [row[3] for row in chunk])
+    return [row[:3] + (ciphertext,) + row[4:] for row, ciphertext in zip(chunk, ciphertexts)]
+
+
+def import_supplier_rows(owner_user_id, rows, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """
+    Insert an iterable of header-keyed rows for a user in a single transaction.
+
+    Rows are consumed lazily and written with executemany() in chunks, so
+    memory stays bounded by chunk_size whatever the size of the source. Any
+    database error rolls the whole import back. If given, progress(stats) is
+    called after every chunk.
+
+    Returns:
+        dict: accepted, rejected, errors, seconds and rows_per_second.
+    """
+    stats = {"accepted": 0, "rejected": 0, "errors": [], "seconds": 0.0, "rows_per_second": 0.0}
+    started = time.perf_counter()
+
+    with get_shard_connection(owner_user_id) as conn:
+        if not conn:
+            raise sqlite3.Error("Database connection error.")
         cursor = conn.cursor()
-        csv_path = remove_invisible_chars(csv_path)
-
-        with open(csv_path, "r", encoding="utf-8-sig") as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                supplier_name = row.get("Supplier Name", "").strip()
-                office_id = row.get("Office ID", "").strip()
-                user_id_val = row.get("User ID", "").strip()
-                password = row.get("Password", "").strip()
-                url = row.get("URL", "").strip()
-
-                if not supplier_name or not password:
-                    continue
-
-                cursor.execute(
-                    """
-                    INSERT INTO suppliers
-                    (supplier_name, office_id, user_id, password, url, last_reset, owner_user_id)
-                    VALUES (?, ?, ?, ?, ?, DATETIME('now'), ?)
-                    """,
-                    (supplier_name, office_id, user_id_val, password, url, user_id),
-                )
-        conn.commit()
-        return True, "Suppliers imported successfully from CSV."
+        # Pause the per-row FTS trigger; the new rows are indexed in one pass below
+        cursor.execute("INSERT INTO fts_sync_paused (paused) VALUES (1)")
+        first_new_id = cursor.execute("SELECT COALESCE(MAX(supplier_id), 0) FROM suppliers").fetchone()[0]
+
+        for chunk in _import_chunks(owner_user_id, rows, stats, chunk_size):
+            cursor.executemany(
+                """
+                INSERT INTO suppliers
+                (supplier_name, office_id, user_id, password, url, last_reset, owner_user_id)
+                VALUES (?, ?, ?, ?, ?, DATETIME('now'), ?)
+                """,
+                chunk,
+            )
+            stats["accepted"] += len(chunk)
+            if stats["accepted"] == len(chunk):
+                bump_supplier_version(conn, owner_user_id)
+            if progress:
+                stats["seconds"] = time.perf_counter() - started
+                stats["rows_per_second"] = stats["accepted"] / stats["seconds"] if stats["seconds"] else 0.0
+                progress(stats)
+
+        cursor.execute("""
+            INSERT INTO suppliers_fts (rowid, supplier_name, office_id, user_id, url, owner_user_id)
+            SELECT supplier_id, supplier_name, office_id, user_id, url, owner_user_id
+            FROM suppliers WHERE supplier_id > ?
+        """, (first_new_id,))
+        cursor.execute("DELETE FROM fts_sync_paused")
+
+    invalidate_supplier_cache(owner_user_id)
+    stats["seconds"] = time.perf_counter() - started
+    if stats["seconds"] > 0:
+        stats["rows_per_second"] = stats["accepted"] / stats["seconds"]
+    return stats
+
+
+def _import_summary(stats):
+    return (
+        f"Imported {stats['accepted']} supplier(s), rejected {stats['rejected']} "
+        f"in {stats['seconds']:.2f}s ({stats['rows_per_second']:.0f} rows/s)."
+    )
+
+
+def process_csv(filepath, user_id, progress=None):
+    """
+    Import suppliers from an uploaded CSV file with the IMPORT_HEADERS columns.
+
+    Returns:
+        tuple: (success, message, stats)
+    """
+    try:
+        with open(filepath, "r", encoding="utf-8-sig", newline="") as file:
+            stats = import_supplier_rows(user_id, csv.DictReader(file), progress=progress)
+        return True, _import_summary(stats), stats
     except Exception as e:
-        return False, f"Error importing suppliers from CSV: {e}"
+        return False, f"Error importing suppliers from CSV: {e}", None
+
+
+def xlsx_supported():
+    """openpyxl is optional; check for it before accepting or promising an XLSX file."""
+    return importlib.util.find_spec("openpyxl") is not None
+
+
+def _cell_text(value):
+    """Spreadsheet cell -> import string (Excel stores 123 as 123.0)."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _sheet_rows(values):
+    """Turn an iterator of row tuples (header first) into import row dicts, skipping blank rows."""
+    header = [_cell_text(cell).strip() for cell in next(values, ())]
+    for row in values:
+        cells = [_cell_text(cell) for cell in row]
+        if any(cells):
+            yield dict(zip(header, cells))
+
+
+def iter_xlsx_rows(filepath):
+    """
+    Yield import rows from the first sheet of an .xlsx workbook.
+
+    openpyxl's read-only mode parses the sheet XML as it is iterated, so
+    memory stays flat however large the workbook is.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        yield from _sheet_rows(workbook.worksheets[0].iter_rows(values_only=True))
     finally:
-        conn.close()
+        workbook.close()
+
+
+def iter_xls_rows(filepath):
+    """
+    Yield import rows from a legacy .xls workbook.
+
+    openpyxl cannot read the binary format, so this falls back to pandas,
+    imported here so it is only loaded for .xls uploads (at most 65,536 rows).
+    """
+    import pandas as pd
+
+    frame = pd.read_excel(filepath, dtype=str, header=None).fillna("")
+    yield from _sheet_rows(frame.itertuples(index=False, name=None))
+
+
+def process_excel(filepath, user_id, progress=None):
+    """
+    Import suppliers from an uploaded .xls/.xlsx file with the IMPORT_HEADERS columns.
+
+    Rows are streamed into the same chunked insert path as CSV imports.
+
+    Returns:
+        tuple: (success, message, stats)
+    """
+    try:
+        if filepath.lower().endswith(".xls"):
+            rows = iter_xls_rows(filepath)
+        elif not xlsx_supported():
+            return False, XLSX_IMPORT_UNAVAILABLE, None
+        else:
+            rows = iter_xlsx_rows(filepath)
+        stats = import_supplier_rows(user_id, rows, progress=progress)
+        return True, _import_summary(stats), stats
+    except Exception as e:
+        return False, f"Error importing suppliers from Excel: {e}", None
+
+
+def import_suppliers_from_csv(user_id, csv_path):
+    """
+    Import suppliers from a CSV file for the user.
+    """
+    csv_path = remove_invisible_chars(csv_path)
+    success, msg, _ = process_csv(csv_path, user_id)
+    return success, msg
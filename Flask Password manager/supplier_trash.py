@@ -0,0 +1,119 @@
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+
+from db_utils import get_connection, run_migrations, shard_paths
+
+# Trashed suppliers can be restored for this long before they are purged
+SUPPLIER_TRASH_RETENTION_DAYS = int(os.getenv("SUPPLIER_TRASH_RETENTION_DAYS", "30"))
+SUPPLIER_PURGE_INTERVAL_SECONDS = int(os.getenv("SUPPLIER_PURGE_INTERVAL_SECONDS", "3600"))
+# Rows deleted / pages released per transaction, to keep write locks short
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "500"))
+VACUUM_PAGES_PER_STEP = int(os.getenv("VACUUM_PAGES_PER_STEP", "256"))
+
+
+def purge_deleted_suppliers(now=None, batch_size=PURGE_BATCH_SIZE):
+    """
+    Permanently remove suppliers trashed more than SUPPLIER_TRASH_RETENTION_DAYS ago.
+
+    Deletes batch_size rows per transaction (found through idx_suppliers_trash)
+    so web requests are never blocked for long, then hands the freed pages
+    back to the filesystem. Every shard is swept when SHARD_MODE is on.
+
+    Returns:
+        int: number of suppliers purged.
+    """
+    now = now or datetime.now()
+    cutoff = (now - timedelta(days=SUPPLIER_TRASH_RETENTION_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+    purged = 0
+    for db_path in shard_paths():
+        purged_here = 0
+        while True:
+            with get_connection(db_path) as conn:
+                removed = conn.execute(
+                    """
+                    DELETE FROM suppliers WHERE supplier_id IN (
+                        SELECT supplier_id FROM suppliers
+                        WHERE deleted_at IS NOT NULL AND deleted_at <= ?
+                        LIMIT ?
+                    )
+                    """,
+                    (cutoff, batch_size),
+                ).rowcount
+            purged_here += removed
+            if removed < batch_size:
+                break
+
+        if purged_here:
+            reclaim_free_pages(db_path=db_path)
+        purged += purged_here
+    return purged
+
+
+def reclaim_free_pages(pages_per_step=VACUUM_PAGES_PER_STEP, db_path=None):
+    """
+    Run PRAGMA incremental_vacuum in small steps until the freelist is empty.
+
+    Does nothing unless the database uses auto_vacuum = INCREMENTAL.
+    Returns the number of pages released.
+    """
+    with get_connection(db_path) as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return 0
+
+    released = 0
+    while True:
+        with get_connection(db_path) as conn:
+            free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if not free_pages:
+                return released
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages_per_step)})").fetchall()
+        released += min(free_pages, pages_per_step)
+
+
+def enable_incremental_vacuum():
+    """
+    Switch an existing database to auto_vacuum = INCREMENTAL.
+
+    Requires one full VACUUM, which rewrites the whole file and blocks
+    writers while it runs; new databases get the setting from create_connection.
+    """
+    with get_connection() as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    return True
+
+
+def _purge_loop(interval_seconds, stop_event):
+    while not stop_event.wait(interval_seconds):
+        try:
+            purge_deleted_suppliers()
+        except Exception as e:
+            print(f"Error purging deleted suppliers: {e}")
+
+
+def start_purge_scheduler(interval_seconds=SUPPLIER_PURGE_INTERVAL_SECONDS):
+    """
+    Purge expired trash every interval_seconds on a daemon thread.
+
+    Safe to run in several workers at once: each batch deletes whatever is
+    still expired when it runs. Returns the threading.Event that stops the loop.
+    """
+    stop_event = threading.Event()
+    thread = threading.Thread(
+        target=_purge_loop, args=(interval_seconds, stop_event), name="supplier-purge", daemon=True
+    )
+    thread.start()
+    return stop_event
+
+
+if __name__ == "__main__":
+    # python supplier_trash.py [--enable-auto-vacuum]
+    run_migrations()
+    if "--enable-auto-vacuum" in sys.argv[1:]:
+        if enable_incremental_vacuum():
+            print("Database converted to incremental auto-vacuum.")
+    print(f"Purged {purge_deleted_suppliers()} deleted supplier(s).")
@@ -1,38 +1,47 @@
-from db_utils import create_connection
+from db_utils import get_connection
 from otp_utils import generate_otp, send_otp_via_email
+from password_hashing import hash_password, verify_password
 
 def register_user(username, email, password):
-    conn = create_connection()
-    if not conn:
-        return False, "Database connection error."
-
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE username = ? OR email = ?", (username, email))
-    row = cursor.fetchone()
-    if row:
-        conn.close()
-        return False, "Username or email is already registered."
-
-    cursor.execute("INSERT INTO users (username, email, password) VALUES (?, ?, ?)", (username, email, password))
-    conn.commit()
-    conn.close()
+    password_hash = hash_password(password)
+    with get_connection() as conn:
+        if not conn:
+            return False, "Database connection error."
+
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM users WHERE username = ? OR email = ?", (username, email))
+        row = cursor.fetchone()
+        if row:
+            return False, "Username or email is already registered."
+
+        cursor.execute("INSERT INTO users (username, email, password) VALUES (?, ?, ?)", (username, email, password_hash))
     return True, "Registration successful!"
 
 def sign_in_user(username, password):
-    conn = create_connection()
-    if not conn:
-        return None, "Database connection error."
+    with get_connection() as conn:
+        if not conn:
+            return None, "Database connection error."
 
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
-    user_data = cursor.fetchone()
-    conn.close()
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
+        user_data = cursor.fetchone()
 
     if not user_data:
         return None, "No such user found. Please register first."
 
     user_id, db_username, db_email, db_password = user_data
-    if password == db_password:
-        return user_data, None
-    else:
+    matches, needs_rehash = verify_password(password, db_password)
+    if not matches:
         return None, "Incorrect username or password."
+
+    if needs_rehash:
+        # Upgrade legacy plain-text rows and outdated hash parameters in place
+        with get_connection() as conn:
+            conn.execute("UPDATE users SET password = ? WHERE user_id = ?", (hash_password(password), user_id))
+    return user_data, None
+
+def set_user_password(email, new_password):
+    """Store a new (hashed) account password for the user with this email."""
+    password_hash = hash_password(new_password)
+    with get_connection() as conn:
+        conn.execute("UPDATE users SET password = ? WHERE email = ?", (password_hash, email))